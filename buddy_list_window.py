@@ -2,7 +2,7 @@ import sys
 import os
 import time
 import datetime
-import traceback
+import logging
 from sound_utils import play_sound_async, set_sounds_enabled
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
@@ -25,6 +25,8 @@ NODE_OFFLINE_TIMEOUT_SEC = 10 * 60
 LOGS_SUBDIR = "chat_logs"
 PUBLIC_CHAT_ID = "^all"
 
+logger = logging.getLogger(__name__)
+
 NODE_ID_ROLE = Qt.UserRole + 0
 ITEM_TYPE_ROLE = Qt.UserRole + 1
 HW_MODEL_ROLE = Qt.UserRole + 2
@@ -600,30 +602,9 @@ class BuddyListWindow(QMainWindow):
                 print(f"[Buddy List] Our node ID is: {my_node_id}")
 
         for node_data in nodes_list:
-            user_info = node_data.get('user', {})
-            node_id = user_info.get('id')
-
-            if not node_id or node_id == self.connection_settings.get("screen_name") or node_id == PUBLIC_CHAT_ID:
-                continue
-
-            current_mesh_node_ids.add(node_id)
-            display_name = user_info.get('longName') or user_info.get('shortName') or node_id
-
-            is_active = node_data.get('active_report', False)
-            if is_active:
-                print(f"[Buddy List] Node {node_id} is ACTIVE, forcing Online status")
-                status = "Online"
-                icon = self.online_icon
-            else:
-                status = compute_node_status(node_data)
-                if status == "Online":
-                    icon = self.online_icon
-                elif status == "Away":
-                    icon = self.away_icon
-                else:
-                    icon = self.offline_icon
-
-            self.add_or_update_buddy(None, node_id, display_name, status, node_data, force_icon=icon)
+            node_id = self._update_mesh_buddy(node_data)
+            if node_id:
+                current_mesh_node_ids.add(node_id)
 
         nodes_to_remove = self.displayed_mesh_nodes - current_mesh_node_ids
         for node_id_to_remove in nodes_to_remove:
@@ -846,9 +827,9 @@ class BuddyListWindow(QMainWindow):
             chat_win.raise_()
         except ImportError:
             QMessageBox.critical(self, "Error", "Chat window component failed.")
-            traceback.print_exc()
+            logger.debug("Chat window import failed", exc_info=True)
         except Exception as e:
-            traceback.print_exc()
+            logger.debug("Could not open chat window for %s", chat_id, exc_info=True)
             QMessageBox.critical(self, "Error", f"Could not open chat window: {e}")
 
     @Slot(str, str, str, str, str)
@@ -937,7 +918,7 @@ class BuddyListWindow(QMainWindow):
                     win.raise_()
                     win.activateWindow()
             except Exception:
-                traceback.print_exc()
+                logger.debug("Could not deliver message to chat window %s", chat_id, exc_info=True)
         else:
             pass
 
@@ -983,30 +964,9 @@ class BuddyListWindow(QMainWindow):
                 print(f"[Buddy List] Our node ID is: {my_node_id}")
 
         for node_data in nodes_list:
-            user_info = node_data.get('user', {})
-            node_id = user_info.get('id')
-
-            if not node_id or node_id == self.connection_settings.get("screen_name") or node_id == PUBLIC_CHAT_ID:
-                continue
-
-            current_mesh_node_ids.add(node_id)
-            display_name = user_info.get('longName') or user_info.get('shortName') or node_id
-
-            is_active = node_data.get('active_report', False)
-            if is_active:
-                print(f"[Buddy List] Node {node_id} is ACTIVE, forcing Online status")
-                status = "Online"
-                icon = self.online_icon
-            else:
-                status = compute_node_status(node_data)
-                if status == "Online":
-                    icon = self.online_icon
-                elif status == "Away":
-                    icon = self.away_icon
-                else:
-                    icon = self.offline_icon
-
-            self.add_or_update_buddy(None, node_id, display_name, status, node_data, force_icon=icon)
+            node_id = self._update_mesh_buddy(node_data)
+            if node_id:
+                current_mesh_node_ids.add(node_id)
 
         nodes_to_remove = self.displayed_mesh_nodes - current_mesh_node_ids
         for node_id_to_remove in nodes_to_remove:
@@ -1035,6 +995,39 @@ class BuddyListWindow(QMainWindow):
                     self.status_combo.setCurrentText("Online")
                     self.status_combo.blockSignals(False)
 
+    def handle_node_update(self, node_data):
+        """Refreshes a single mesh buddy without treating the update as a full node snapshot."""
+        node_id = self._update_mesh_buddy(node_data)
+        if node_id and node_id not in self.displayed_mesh_nodes:
+            self.displayed_mesh_nodes.add(node_id)
+            self._apply_saved_group_assignments()
+
+    def _update_mesh_buddy(self, node_data):
+        user_info = node_data.get('user', {})
+        node_id = user_info.get('id')
+
+        if not node_id or node_id == self.connection_settings.get("screen_name") or node_id == PUBLIC_CHAT_ID:
+            return None
+
+        display_name = user_info.get('longName') or user_info.get('shortName') or node_id
+
+        is_active = node_data.get('active_report', False)
+        if is_active:
+            print(f"[Buddy List] Node {node_id} is ACTIVE, forcing Online status")
+            status = "Online"
+            icon = self.online_icon
+        else:
+            status = compute_node_status(node_data)
+            if status == "Online":
+                icon = self.online_icon
+            elif status == "Away":
+                icon = self.away_icon
+            else:
+                icon = self.offline_icon
+
+        self.add_or_update_buddy(None, node_id, display_name, status, node_data, force_icon=icon)
+        return node_id
+
 
     @Slot()
     def _request_settings(self):
@@ -1,15 +1,20 @@
+import atexit
 import json
+import logging
+import logging.handlers
 import os
+import queue
 import ssl
 import sys
-import traceback
 from datetime import time
 from pathlib import Path
 import uuid
 import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 
 import paho.mqtt.client as mqtt
-from PySide6.QtCore import QObject, Slot, QTimer, QStandardPaths, QCoreApplication, Signal
+from PySide6.QtCore import QObject, Slot, QTimer, QStandardPaths, QCoreApplication, Signal, QByteArray
 from PySide6.QtGui import QFontDatabase, QFont, QIcon
 from PySide6.QtWidgets import QApplication, QMessageBox
 
@@ -31,6 +36,32 @@ UPDATES_CLIENT_AUTH_NAME = "mim-client"
 MQTT_MAP_JSON_TOPIC = "msh/US/2/json/#"
 MQTT_MAP_PROTO_TOPIC = "msh/US/2/map/#"
 
+logger = logging.getLogger(__name__)
+LOG_DUPLICATE_WINDOW_SEC = 1.0
+
+
+class DuplicateLogFilter(logging.Filter):
+    """Drops WARNING+ records repeating one already let through within the window."""
+
+    def __init__(self, window_sec=LOG_DUPLICATE_WINDOW_SEC):
+        super().__init__()
+        self.window_sec = window_sec
+        self._last_seen = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = record.created
+        last = self._last_seen.get(key)
+        if last is not None and now - last < self.window_sec:
+            return False
+        if len(self._last_seen) > 256:
+            self._last_seen = {k: t for k, t in self._last_seen.items() if now - t < self.window_sec}
+        self._last_seen[key] = now
+        return True
+
+
 def get_resource_path(relative_path):
     try:
         base_path = sys._MEIPASS
@@ -38,6 +69,48 @@ def get_resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def map_entry_for_node(node_data):
+    user_info = node_data.get('user', {})
+    node_id_str = user_info.get('id')
+    if not node_id_str and 'num' in node_data:
+        node_id_str = f"!{node_data['num']:x}"
+    if not node_id_str:
+        node_id_str = str(uuid.uuid4())
+
+    pos_info = node_data.get('position', {})
+    metrics_info = node_data.get('deviceMetrics', {})
+
+    entry = {
+        "nodeId": node_id_str,
+        "user": {
+            "id": node_id_str,
+            "longName": user_info.get('longName', node_id_str),
+            "shortName": user_info.get('shortName', '')
+        },
+        "lastHeard": int(node_data.get('lastHeard', 0.0)), # Ensure it's a number
+        "snr": node_data.get('snr'),
+        "active_report": node_data.get('active_report', False),
+        "deviceMetrics": metrics_info.copy()
+    }
+
+    if pos_info and 'latitude' in pos_info and 'longitude' in pos_info and \
+            pos_info['latitude'] is not None and pos_info['longitude'] is not None:
+        entry["position"] = {
+            "latitude": pos_info.get('latitude'),
+            "longitude": pos_info.get('longitude'),
+            "altitude": pos_info.get('altitude', 0)
+        }
+
+    return entry
+
+
+def read_font_file(font_path):
+    try:
+        with open(font_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
 def get_config_path():
     app_data_dir = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
     if not app_data_dir:
@@ -108,6 +181,14 @@ class ApplicationController(QObject):
     update_notification_received = Signal(str)
     mqtt_map_node_update_received = Signal(dict)
 
+    __slots__ = (
+        "app", "login_window", "buddy_list_window", "settings_window", "map_window",
+        "current_config", "connection_settings", "mqtt_client", "update_mqtt_client",
+        "meshtastic_handler", "node_update_timer", "_signing_off", "_quitting",
+        "_connection_error_shown", "_node_list_initial_request_pending", "_last_channel_list",
+        "_last_nodes_list", "_subscribed_mqtt_groups", "_message_notifications_enabled",
+    )
+
     def __init__(self, app: QApplication):
         super().__init__()
         self.app = app
@@ -134,6 +215,8 @@ class ApplicationController(QObject):
         self.node_update_timer = QTimer(self)
         self.node_update_timer.timeout.connect(self._request_periodic_node_update)
 
+        self._init_meshtastic_handler()
+
         self.mqtt_connection_updated.connect(self._handle_mqtt_connection_update)
         self.mqtt_message_received_signal.connect(self._route_incoming_mqtt_message)
         self.update_notification_received.connect(self._handle_update_notification)
@@ -145,6 +228,24 @@ class ApplicationController(QObject):
         self.show_login_window()
 
 
+    def _init_meshtastic_handler(self):
+        """Creates the long-lived Meshtastic handler; sign-ins only reconfigure it."""
+        try:
+            self.meshtastic_handler = MeshtasticHandler({}, parent=self)
+        except Exception:
+            logger.exception("Meshtastic handler creation failed")
+            self.meshtastic_handler = None
+            return
+        self.meshtastic_handler.connection_status.connect(self.handle_meshtastic_connection_status)
+        self.meshtastic_handler.message_received.connect(self.route_incoming_message_from_mesh)
+        self.meshtastic_handler.messages_received_batch.connect(self.route_incoming_messages_from_mesh)
+        self.meshtastic_handler.node_list_updated.connect(self._handle_node_list_update)
+        self.meshtastic_handler.node_updated.connect(self._handle_node_update)
+        self.meshtastic_handler.node_list_delta.connect(self._handle_node_list_delta)
+        self.meshtastic_handler.channel_list_updated.connect(self._handle_channel_list_update)
+        self.meshtastic_handler.message_send_failed.connect(self._handle_mesh_send_failed)
+        self.meshtastic_handler._connection_established_signal.connect(self._start_initial_node_list_request)
+
     @Slot(str)
     def _handle_update_notification(self, message_text):
         if self.buddy_list_window and self.buddy_list_window.isVisible():
@@ -212,7 +313,7 @@ class ApplicationController(QObject):
                 client.on_message = None
                 print("[ApplicationController] Update MQTT client disconnected.")
             except Exception:
-                traceback.print_exc()
+                logger.debug("Update MQTT client disconnect failed", exc_info=True)
                 print("[ApplicationController Error] Exception during update MQTT client disconnect.")
         else:
             print("[ApplicationController] No update MQTT client to disconnect.")
@@ -263,9 +364,9 @@ class ApplicationController(QObject):
         except FileNotFoundError:
              self.update_mqtt_client = None
         except ssl.SSLError:
-             traceback.print_exc(); self.update_mqtt_client = None
+             logger.debug("Update MQTT TLS setup failed", exc_info=True); self.update_mqtt_client = None
         except Exception:
-            traceback.print_exc()
+            logger.debug("Update MQTT client setup failed", exc_info=True)
             self.update_mqtt_client = None
 
     def _on_update_mqtt_connect(self, client, _userdata, _flags, rc, properties=None):
@@ -276,7 +377,7 @@ class ApplicationController(QObject):
                 if result != mqtt.MQTT_ERR_SUCCESS:
                     pass
             except Exception:
-                traceback.print_exc()
+                logger.debug("Update MQTT subscribe failed", exc_info=True)
         else:
             pass
 
@@ -291,7 +392,7 @@ class ApplicationController(QObject):
         except UnicodeDecodeError:
              pass
         except Exception:
-            traceback.print_exc()
+            logger.debug("Update MQTT message handling failed", exc_info=True)
 
     @Slot(str, str, str, str)
     def handle_mesh_message_received(self, sender_id, display_name, text, msg_type):
@@ -371,7 +472,7 @@ class ApplicationController(QObject):
 
                 except Exception as e:
                     print(f"[MQTT Connect Error] Exception during subscribe: {e}")
-                    traceback.print_exc()
+                    logger.debug("MQTT subscribe failed", exc_info=True)
                     self.mqtt_connection_updated.emit(False, "Exception during subscribe.")
             else:
                 print("[MQTT Connect Warning] No topics (chat or map) to subscribe to.")
@@ -417,7 +518,7 @@ class ApplicationController(QObject):
                     display_name_of_sender
                 )
             except Exception:
-                traceback.print_exc()
+                logger.debug("MQTT message routing failed", exc_info=True)
         else:
             print("[MQTT Route Warning] Buddy list window not available.")  # DEBUG
 
@@ -451,7 +552,7 @@ class ApplicationController(QObject):
         if self._signing_off or self._quitting: return
         if not self.meshtastic_handler or not self.meshtastic_handler.is_running:
              return
-        self.meshtastic_handler.request_node_list()
+        self.meshtastic_handler.schedule_node_list()
         self.meshtastic_handler.request_channel_list()
         if not self.node_update_timer.isActive():
             self.node_update_timer.start(NODE_UPDATE_INTERVAL_MS)
@@ -464,7 +565,8 @@ class ApplicationController(QObject):
 
         self.meshtastic_handler.reset_active_flags()
 
-        self.meshtastic_handler.request_node_list()
+        # Forced: statuses age with wall-clock time even when no node data changed.
+        self.meshtastic_handler.schedule_node_list(force=True)
         self.meshtastic_handler.request_channel_list()
 
     @Slot(list)
@@ -609,7 +711,6 @@ class ApplicationController(QObject):
 
         if self.login_window:
             self.login_window.setWindowTitle("Connecting...")
-            QApplication.processEvents()
 
         self.connect_services()
 
@@ -643,7 +744,7 @@ class ApplicationController(QObject):
             self.buddy_list_window.show()
 
         except Exception:
-            traceback.print_exc()
+            logger.debug("Buddy list window creation failed", exc_info=True)
             QMessageBox.critical(None, "UI Error", f"Failed to create buddy list window.")
             self.buddy_list_window = None
             self.handle_sign_off()
@@ -692,7 +793,7 @@ class ApplicationController(QObject):
             self.show_buddy_list()
             if self.buddy_list_window:
                 self.buddy_list_window.statusBar().showMessage("Connecting...", 0)
-                QApplication.processEvents()
+                self.buddy_list_window.statusBar().repaint()
             else:
                 self.handle_sign_off()
                 return
@@ -723,8 +824,8 @@ class ApplicationController(QObject):
                 self.mqtt_client.loop_start()
 
             except Exception:
-                traceback.print_exc()
                 if not self._connection_error_shown:
+                    logger.debug("MQTT client initialization failed", exc_info=True)
                     parent = self.buddy_list_window or None
                     QMessageBox.critical(parent, "MQTT Setup Error", f"Failed to initialize MQTT client.")
                     self._connection_error_shown = True
@@ -736,13 +837,9 @@ class ApplicationController(QObject):
 
         mesh_type = settings.get('mesh_conn_type', 'None')
         if mesh_type != 'None':
-            if self.meshtastic_handler:
-                self._disconnect_mesh_handler()
-                QTimer.singleShot(250, lambda: self._create_and_connect_meshtastic(settings))
-            else:
-                self._create_and_connect_meshtastic(settings)
+            self._create_and_connect_meshtastic(settings)
         else:
-            self.meshtastic_handler = None
+            self._disconnect_mesh_handler()
             if not settings.get('server'):
                 if not self._connection_error_shown:
                     parent = self.buddy_list_window or None
@@ -908,7 +1005,7 @@ class ApplicationController(QObject):
             return None
         except Exception as e:
             print(f"[Map MQTT JSON Parse] Error parsing map JSON for topic {topic}: {e}")
-            traceback.print_exc()
+            logger.debug("Map JSON payload parsing failed", exc_info=True)
             return None
 
     def _on_main_mqtt_message(self, _client, _userdata, msg):
@@ -940,7 +1037,7 @@ class ApplicationController(QObject):
                     print(f"[Map MQTT RX Error] Failed to decode UTF-8 payload on JSON map topic {topic}.")
             except Exception as e:
                 print(f"[Map MQTT RX Error] General error processing map message from topic {topic}: {e}")
-                traceback.print_exc()
+                logger.debug("Map MQTT message handling failed", exc_info=True)
             return
 
         try:
@@ -1008,30 +1105,26 @@ class ApplicationController(QObject):
             print(f"[MQTT Chat Message Error] Failed to decode UTF-8 payload on topic {topic}. Likely binary content.")
         except Exception as e:
             print(f"[MQTT Chat Message Error] General error processing chat message from topic {topic}: {e}")
-            traceback.print_exc()
+            logger.debug("Chat MQTT message handling failed", exc_info=True)
 
     def _create_and_connect_meshtastic(self, settings):
         if self._signing_off or self._quitting:
             return
-        if self.meshtastic_handler:
-            self._disconnect_mesh_handler()
+        self._disconnect_mesh_handler()
 
         try:
-            self.meshtastic_handler = MeshtasticHandler(settings)
-            self.meshtastic_handler.connection_status.connect(self.handle_meshtastic_connection_status)
-            self.meshtastic_handler.message_received.connect(self.route_incoming_message_from_mesh)
-            self.meshtastic_handler.node_list_updated.connect(self._handle_node_list_update)
-            self.meshtastic_handler.channel_list_updated.connect(self._handle_channel_list_update)
-            self.meshtastic_handler._connection_established_signal.connect(self._start_initial_node_list_request)
+            if self.meshtastic_handler is None:
+                raise RuntimeError("Meshtastic handler is not available.")
+            self.meshtastic_handler.reconfigure(settings)
 
             connect_initiated = self.meshtastic_handler.connect_to_device()
-            if not connect_initiated and self.meshtastic_handler:
+            if not connect_initiated:
                 QTimer.singleShot(0, lambda: self.handle_meshtastic_connection_status(False,
                                                                                       "Initial connection setup failed (e.g., invalid port/IP)"))
 
         except Exception:
-             traceback.print_exc()
              if not self._connection_error_shown:
+                 logger.debug("Meshtastic connect failed", exc_info=True)
                  parent = self.buddy_list_window or None
                  QMessageBox.critical(parent, "Meshtastic Error", f"Failed Meshtastic handler initialization.")
                  self._connection_error_shown = True
@@ -1086,21 +1179,8 @@ class ApplicationController(QObject):
              self.node_update_timer.stop()
 
         if self.meshtastic_handler:
-            handler = self.meshtastic_handler
-            self.meshtastic_handler = None
-            try: handler._connection_established_signal.disconnect(self._start_initial_node_list_request)
-            except (TypeError, RuntimeError): pass
-            try: handler.connection_status.disconnect(self.handle_meshtastic_connection_status)
-            except (TypeError, RuntimeError): pass
-            try: handler.message_received.disconnect(self.route_incoming_message_from_mesh)
-            except (TypeError, RuntimeError): pass
-            try: handler.node_list_updated.disconnect(self._handle_node_list_update)
-            except (TypeError, RuntimeError): pass
-            try: handler.channel_list_updated.disconnect(self._handle_channel_list_update)
-            except (TypeError, RuntimeError): pass
-
             try:
-                handler.disconnect()
+                self.meshtastic_handler.disconnect()
             except Exception:
                 pass
 
@@ -1115,7 +1195,7 @@ class ApplicationController(QObject):
                 client.on_connect = None; client.on_disconnect = None; client.on_message = None
                 client.on_publish = None; client.on_subscribe = None
             except Exception:
-                traceback.print_exc()
+                logger.debug("MQTT client disconnect failed", exc_info=True)
         else:
             pass
         self._subscribed_mqtt_groups.clear()
@@ -1124,7 +1204,7 @@ class ApplicationController(QObject):
         self._disconnect_mesh_handler()
         self._disconnect_mqtt_client()
 
-    @Slot(list)
+    @Slot(tuple)
     def _handle_node_list_update(self, nodes_list_from_meshtastic):
         if self.buddy_list_window:
             self.buddy_list_window.handle_node_list_update(nodes_list_from_meshtastic)
@@ -1132,46 +1212,28 @@ class ApplicationController(QObject):
         if self.map_window:
             print(f"[AppController] Relaying {len(nodes_list_from_meshtastic)} Meshtastic nodes to MapWindow.")
 
-            transformed_nodes_for_map = []
-            for node_data in nodes_list_from_meshtastic:
-                if not isinstance(node_data, dict): continue
-
-                user_info = node_data.get('user', {})
-                node_id_str = user_info.get('id')
-                if not node_id_str and 'num' in node_data:
-                    node_id_str = f"!{node_data['num']:x}"
-                if not node_id_str:
-                    node_id_str = str(uuid.uuid4())
-
-                pos_info = node_data.get('position', {})
-                metrics_info = node_data.get('deviceMetrics', {})
-
-                entry = {
-                    "nodeId": node_id_str,
-                    "user": {
-                        "id": node_id_str,
-                        "longName": user_info.get('longName', node_id_str),
-                        "shortName": user_info.get('shortName', '')
-                    },
-                    "lastHeard": int(node_data.get('lastHeard', 0.0)), # Ensure it's a number
-                    "snr": node_data.get('snr'),
-                    "active_report": node_data.get('active_report', False),
-                    "deviceMetrics": metrics_info.copy()
-                }
-
-                if pos_info and 'latitude' in pos_info and 'longitude' in pos_info and \
-                        pos_info['latitude'] is not None and pos_info['longitude'] is not None:
-                    entry["position"] = {
-                        "latitude": pos_info.get('latitude'),
-                        "longitude": pos_info.get('longitude'),
-                        "altitude": pos_info.get('altitude', 0)
-                    }
-
-                transformed_nodes_for_map.append(entry)
+            transformed_nodes_for_map = [map_entry_for_node(node_data)
+                                         for node_data in nodes_list_from_meshtastic
+                                         if isinstance(node_data, Mapping)]
 
             if transformed_nodes_for_map:
                 self.map_window.update_nodes(transformed_nodes_for_map)
 
+    @Slot(dict)
+    def _handle_node_update(self, node_data):
+        if self.buddy_list_window:
+            self.buddy_list_window.handle_node_update(node_data)
+        if self.map_window:
+            self.map_window.update_nodes([map_entry_for_node(node_data)])
+
+    @Slot(list)
+    def _handle_node_list_delta(self, node_list):
+        if self.buddy_list_window:
+            for node_data in node_list:
+                self.buddy_list_window.handle_node_update(node_data)
+        if self.map_window:
+            self.map_window.update_nodes([map_entry_for_node(node_data) for node_data in node_list])
+
     @Slot()
     def _buddy_list_destroyed(self):
         buddy_win_instance = self.buddy_list_window
@@ -1204,7 +1266,16 @@ class ApplicationController(QObject):
     def route_incoming_message_from_mesh(self, sender_id, display_name, text, msg_type):
         print(f"[Main] Received {msg_type} message from {sender_id} ({display_name}): '{text[:30]}...'")
         play_sound_async("receive.wav")  # Uses "receive.wav"
+        self._deliver_mesh_message(sender_id, display_name, text, msg_type)
 
+    @Slot(list)
+    def route_incoming_messages_from_mesh(self, messages):
+        print(f"[Main] Received batch of {len(messages)} mesh messages")
+        play_sound_async("receive.wav")
+        for sender_id, display_name, text, msg_type in messages:
+            self._deliver_mesh_message(sender_id, display_name, text, msg_type)
+
+    def _deliver_mesh_message(self, sender_id, display_name, text, msg_type):
         if msg_type == 'direct':
             print(f"[Main] Opening chat window for direct message from {sender_id}")
             if self.buddy_list_window:
@@ -1234,6 +1305,11 @@ class ApplicationController(QObject):
                 print(f"[Main] ERROR: Cannot handle broadcast message, buddy_list_window is None!")
 
 
+    @Slot(str, str)
+    def _handle_mesh_send_failed(self, destination_id, reason):
+        if self.buddy_list_window:
+            self.buddy_list_window.statusBar().showMessage(f"Error: message to {destination_id} not sent ({reason})", 5000)
+
     @Slot(str, str, str)
     def handle_send_request(self, recipient_id, message_text, network_type):
         if network_type == 'meshtastic':
@@ -1260,7 +1336,7 @@ class ApplicationController(QObject):
                         if self.buddy_list_window:
                             self.buddy_list_window.statusBar().showMessage(f"Error sending IM (Code: {result})", 3000)
                 except Exception:
-                    traceback.print_exc()
+                    logger.debug("MQTT publish failed", exc_info=True)
                     if self.buddy_list_window:
                         self.buddy_list_window.statusBar().showMessage("Error sending IM.", 3000)
             else:
@@ -1337,6 +1413,22 @@ class ApplicationController(QObject):
             self.map_window.raise_()
 
 if __name__ == '__main__':
+    # Records are handed to a listener thread, so the meshtastic reader thread never blocks
+    # on console writes.
+    log_queue = queue.SimpleQueue()
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter("[%(name)s] %(levelname)s: %(message)s"))
+    log_listener = logging.handlers.QueueListener(log_queue, console_handler)
+    # Filtered before the QueueHandler so a repeating error is not formatted, traceback
+    # included, on the thread that raised it.
+    log_queue_handler = logging.handlers.QueueHandler(log_queue)
+    log_queue_handler.addFilter(DuplicateLogFilter())
+    logging.basicConfig(level=logging.DEBUG if os.environ.get("MIM_DEBUG") else logging.INFO,
+                        handlers=[log_queue_handler])
+    log_listener.start()
+    # atexit runs after non-daemon threads (e.g. the interface close) are joined, so records
+    # from cleanup() and those threads are still written.
+    atexit.register(log_listener.stop)
     app = QApplication(sys.argv)
     app.setApplicationName("MIMMeshtastic")
     app.setOrganizationName("MIMDev")
@@ -1350,14 +1442,19 @@ if __name__ == '__main__':
     font_dir = get_resource_path("resources/fonts")
     loaded_font_families = []
     if os.path.isdir(font_dir):
-        for filename in os.listdir(font_dir):
-            if filename.lower().endswith((".ttf", ".otf")):
-                font_path = os.path.join(font_dir, filename)
-                font_id = QFontDatabase.addApplicationFont(font_path)
-                if font_id != -1:
-                    families = QFontDatabase.applicationFontFamilies(font_id)
-                    if "Helvetica" in families and "Helvetica" not in loaded_font_families:
-                        loaded_font_families.append("Helvetica")
+        with os.scandir(font_dir) as it:
+            font_paths = [e.path for e in it if e.is_file() and e.name.lower().endswith((".ttf", ".otf"))]
+        # File reads run in parallel; Qt font registration stays on the main thread.
+        with ThreadPoolExecutor() as pool:
+            font_blobs = list(pool.map(read_font_file, font_paths))
+        for font_data in font_blobs:
+            if font_data is None:
+                continue
+            font_id = QFontDatabase.addApplicationFontFromData(QByteArray(font_data))
+            if font_id != -1:
+                families = QFontDatabase.applicationFontFamilies(font_id)
+                if "Helvetica" in families and "Helvetica" not in loaded_font_families:
+                    loaded_font_families.append("Helvetica")
 
     default_font_family = "Helvetica" if "Helvetica" in loaded_font_families else "Arial"
     default_font_size = 9
@@ -1370,12 +1467,8 @@ if __name__ == '__main__':
         print(f"DEBUG: Stylesheet '{qss_path}' loaded successfully.")  # Optional: for confirmation
     except FileNotFoundError:
         print(f"WARNING: Stylesheet file not found at '{qss_path}'. Proceeding without custom styles.")
-    except Exception as e:
-        import traceback
-
-        print(f"CRITICAL ERROR: Failed to load or apply stylesheet from '{qss_path}'.")
-        print("Error details:")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Failed to load or apply stylesheet from '%s'", qss_path)
 
     controller = ApplicationController(app)
     exit_code = app.exec()
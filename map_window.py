@@ -1,17 +1,288 @@
 import sys
 import os
+import hashlib
+import heapq
 import json
+import string
 import time
 import traceback
-import math
 import uuid
 
 from PySide6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QApplication
-from PySide6.QtCore import QUrl, QTimer, QStandardPaths, Signal, QCoreApplication, Slot
+from PySide6.QtCore import QObject, QUrl, QTimer, QStandardPaths, Signal, QCoreApplication, Slot
+from PySide6.QtWebChannel import QWebChannel
 from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtWebEngineCore import QWebEngineSettings
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 NODE_OFFLINE_TIMEOUT_SEC = 600
+MQTT_FLUSH_INTERVAL_MS = 100
+_fresh_id = uuid.uuid4
+
+_MAP_JS_TEMPLATE = string.Template("""
+    window.nodeMarkers = {};
+    const styleElement = document.createElement('style');
+    styleElement.innerHTML = '.marker-ping { transform: scale(1.5); transition: transform 0.2s ease-out; }';
+    document.head.appendChild(styleElement);
+
+    const customIcon = L.icon({
+        iconUrl: 'file:///$icon_path',
+        iconSize: [25, 41],
+        iconAnchor: [12, 41],
+        popupAnchor: [1, -34]
+    });
+
+    var lastNodeUpdateTimes = {};
+
+    function upsertNode(n, now) {
+        if (n.position && n.position.latitude != null && n.position.longitude != null) {
+            const nodeId = n.user.id;
+            const coords = [n.position.latitude, n.position.longitude];
+            const name = n.user.longName || n.user.shortName || nodeId;
+            const snr = n.snr !== undefined && n.snr !== null ? n.snr.toFixed(1) : 'N/A';
+            const lat_val = parseFloat(n.position.latitude); // Ensure numbers
+            const lon_val = parseFloat(n.position.longitude);
+            const lat_str = lat_val.toFixed(5);
+            const lon_str = lon_val.toFixed(5);
+            const ts = n.lastHeard ? new Date(n.lastHeard*1000).toLocaleString() : 'N/A';
+
+            let metricsHTML = '';
+            if (n.deviceMetrics) {
+                const batt = n.deviceMetrics.batteryLevel;
+                if (batt !== undefined && batt !== null) metricsHTML += '<br/><small>Batt: ' + batt + '%</small>';
+            }
+
+            const popupHTML = '<b>' + name + '</b><br/>Lat: ' + lat_str + ', Lon: ' + lon_str + '<br/>Last Heard: ' + ts + '<br/>SNR: ' + snr + metricsHTML;
+            let marker = window.nodeMarkers[nodeId];
+
+            if (marker) { 
+                marker.setLatLng(coords).setPopupContent(popupHTML); 
+            } else { 
+                marker = L.marker(coords, {icon: customIcon}).addTo(mymap).bindPopup(popupHTML); 
+                window.nodeMarkers[nodeId] = marker; 
+            }
+
+            const lastUpdateTime = lastNodeUpdateTimes[nodeId];
+            if (n.lastHeard && (lastUpdateTime === undefined || n.lastHeard > lastUpdateTime) && (now - n.lastHeard < 60)) {
+                if (marker.getElement()) {
+                    marker.getElement().classList.add('marker-ping');
+                    setTimeout(() => {
+                        if (marker.getElement()) { 
+                            marker.getElement().classList.remove('marker-ping'); 
+                        }
+                    }, 300);
+                }
+            }
+            if (n.lastHeard) { 
+                lastNodeUpdateTimes[nodeId] = n.lastHeard; 
+            }
+        }
+    }
+
+    function removeMarker(nodeId) {
+        const marker = window.nodeMarkers[nodeId];
+        if (marker) {
+            mymap.removeLayer(marker);
+            delete window.nodeMarkers[nodeId];
+        }
+        delete lastNodeUpdateTimes[nodeId];
+    }
+
+    window.updateNodesFromPython = function(nodes) {
+        const now = Date.now() / 1000;
+        const seen = {};
+        nodes.forEach(n => {
+            upsertNode(n, now);
+            seen[n.user.id] = true;
+        });
+        Object.keys(window.nodeMarkers).forEach(nodeId => {
+            if (!seen[nodeId]) removeMarker(nodeId);
+        });
+    };
+
+    window.updateNodesDelta = function(nodes) {
+        const now = Date.now() / 1000;
+        nodes.forEach(n => upsertNode(n, now));
+    };
+
+    window.removeNodes = function(nodeIds) {
+        nodeIds.forEach(removeMarker);
+    };
+
+    var mymap = L.map('mapid').setView([$lat, $lon], $zoom);
+    var tileUrl = '$tile_url';
+    var opts = {maxZoom: 19, tms: false};
+
+    if ($offline) {
+        var p = encodeURIComponent('$offline_dir').replace(/%2F/g, '/');
+        tileUrl = 'file:///' + p + '/{z}/{x}/{y}.png';
+    }
+    L.tileLayer(tileUrl, opts).addTo(mymap);
+    console.log("Leaflet map initialized with tileUrl:", tileUrl);
+
+    // Simpler ready signal for Python
+    if(typeof qt !== 'undefined' && typeof qt.webChannelTransport !== 'undefined') {
+        new QWebChannel(qt.webChannelTransport, function(channel) {
+            window.pyJsBridge = channel.objects.pyJsBridge;
+            if(window.pyJsBridge) {
+                console.log('Map JS: pyJsBridge available, signaling mapJsReady');
+                window.pyJsBridge.nodesReady.connect(window.updateNodesFromPython);
+                window.pyJsBridge.nodesDeltaReady.connect(window.updateNodesDelta);
+                window.pyJsBridge.nodesRemoved.connect(window.removeNodes);
+                window.pyJsBridge.mapJsIsReady();
+            } else {
+                console.error('Map JS: pyJsBridge object not found on channel.');
+            }
+        });
+    } else {
+         // Fallback if QWebChannel is not set up by Python side for this specific call yet
+         // This relies on the Python-side timer in on_loaded.
+        console.log('Map JS: QWebChannel not immediately available. Python timer will handle readiness.');
+    }
+""")
+
+_HTML_SHELL = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8"/>
+    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
+    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+    <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
+    <style>
+        html, body, #mapid {{ height: 100%; margin: 0; padding: 0; }}
+        .marker-ping {{ transform: scale(1.5); transition: transform 0.2s ease-out; }}
+    </style>
+    <script>
+        window.onerror = function(msg, url, line, col, error) {{
+            console.error("JS Error:", msg, "URL:", url, "Line:", line, "Col:", col, "Error Obj:", error);
+            if (window.pyJsBridge && window.pyJsBridge.logError) {{
+                window.pyJsBridge.logError("JS Error: " + msg + " URL:" + url + " Line:" + line);
+            }}
+            return false; // Prevent default browser handling
+        }};
+    </script>
+</head>
+<body>
+    <div id="mapid"></div>
+    <script>
+        {js}
+    </script>
+</body>
+</html>"""
+_MAP_TEMPLATE_DIGEST = hashlib.blake2b((_HTML_SHELL + _MAP_JS_TEMPLATE.template).encode("utf-8"),
+                                       digest_size=8).digest()
+
+
+def _slow_to_float(v, default):
+    try:
+        return float(v)
+    except (ValueError, TypeError):
+        return default
+
+
+def _to_float(v, default=0.0):
+    t = type(v)
+    if t is float:
+        return v
+    if t is int:
+        return float(v)
+    return _slow_to_float(v, default)
+
+
+def clean_node_for_js(n_data):
+    # Everything below is reduced to JSON primitives so dumps() never needs a default= hook.
+    pos = n_data.get("position")
+    if type(pos) is dict and type(pos.get("latitude")) is float and type(pos.get("longitude")) is float:
+        pos = {"latitude": pos["latitude"], "longitude": pos["longitude"]}
+    else:
+        pos = None
+
+    raw_metrics = n_data.get("deviceMetrics") or {}
+    metrics_for_js = {}
+    if type(raw_metrics) is dict:
+        for k, v_val in raw_metrics.items():
+            if isinstance(v_val, (str, int, float, bool)) or v_val is None:
+                metrics_for_js[k] = v_val
+            else:
+                metrics_for_js[k] = str(v_val)
+
+    user_info_from_n_data = n_data.get("user", {})
+    if type(user_info_from_n_data) is not dict:
+        user_info_from_n_data = {}
+
+    return {
+        "user": {
+            "id": str(user_info_from_n_data.get("id", n_data.get("nodeId", "unknown"))),
+            "longName": str(user_info_from_n_data.get("longName") or ""),
+            "shortName": str(user_info_from_n_data.get("shortName") or "")
+        },
+        "position": pos,
+        "snr": _to_float(n_data.get("snr"), None),
+        "deviceMetrics": metrics_for_js,
+        "lastHeard": _to_float(n_data.get("lastHeard"), None)
+    }
+
+
+def normalize_node(current, incoming, node_id, now):
+    """Merges one incoming node dict into its map entry and normalizes lastHeard, user and position."""
+    current.update(incoming)
+    # Rebuilt lazily by _push_nodes; nested dicts may be shared with the caller.
+    current.pop('_clean_cache', None)
+
+    last_heard_val = current.get('lastHeard')
+    sanitized_lh = _to_float(last_heard_val, None)
+    if sanitized_lh is None:
+        if last_heard_val is not None:
+            print(
+                f"[MapWindow Warning] Node {node_id} had unconvertible lastHeard '{last_heard_val}'. Using 0.0.")
+        sanitized_lh = 0.0
+    current['lastHeard'] = sanitized_lh
+
+    if current.get("active_report", False):
+        current["lastHeard"] = now
+
+    user_info_final = current.get('user', {})
+    if type(user_info_final) is not dict:
+        user_info_final = {}
+    user_info_final['id'] = node_id
+    current['user'] = user_info_final
+
+    position_val = current.get('position')
+    if position_val is not None:
+        if type(position_val) is dict:
+            lat = _to_float(position_val.get('latitude'), None)
+            lon = _to_float(position_val.get('longitude'), None)
+            if lat is None or lon is None:
+                current.pop("position", None)
+            else:
+                position_val['latitude'] = lat
+                position_val['longitude'] = lon
+        else:
+            try:
+                current["position"] = {"latitude": float(position_val.latitude),
+                                       "longitude": float(position_val.longitude)}
+            except (AttributeError, TypeError, ValueError):
+                current.pop("position", None)
+
+
+class MapBridge(QObject):
+    """Exposed to the map page as pyJsBridge; node lists cross as native arrays, not JS source."""
+    js_ready = Signal()
+    nodesReady = Signal('QVariantList')
+    nodesDeltaReady = Signal('QVariantList')
+    nodesRemoved = Signal('QVariantList')
+
+    @Slot()
+    def mapJsIsReady(self):
+        self.js_ready.emit()
+
+    @Slot(str)
+    def logError(self, message):
+        print(f"[MapWindow JS] {message}")
 
 
 class MapWindow(QMainWindow):
@@ -23,12 +294,25 @@ class MapWindow(QMainWindow):
         self.setMinimumSize(600, 500)
         self.settings = settings or {}
         self._node_data = {}
+        self._expiry_heap = []
         self._map_js_ready = False
         self._pending_node_updates = []
         self.map_loaded_timer = QTimer(self)
         self.map_loaded_timer.setSingleShot(True)
         self.map_loaded_timer.timeout.connect(self._handle_map_js_ready)
 
+        self._pending_mqtt = []
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(MQTT_FLUSH_INTERVAL_MS)
+        self._flush_timer.timeout.connect(self._flush_pending)
+
+        self._bridge_connected = False
+        self.bridge = MapBridge(self)
+        self.bridge.js_ready.connect(self._handle_bridge_ready)
+        self.channel = QWebChannel(self)
+        self.channel.registerObject("pyJsBridge", self.bridge)
+
         central = QWidget()
         self.setCentralWidget(central)
         layout = QVBoxLayout(central)
@@ -38,6 +322,7 @@ class MapWindow(QMainWindow):
         view_settings = self.map_view.settings()
         view_settings.setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
         view_settings.setAttribute(QWebEngineSettings.JavascriptEnabled, True)
+        self.map_view.page().setWebChannel(self.channel)
 
         self.map_view.loadFinished.connect(self.on_loaded)
         self.load_initial_map()
@@ -45,7 +330,16 @@ class MapWindow(QMainWindow):
     @Slot(dict)
     def handle_mqtt_node_update(self, node_data_dict):
         if node_data_dict:
-            self.update_nodes([node_data_dict])
+            self._pending_mqtt.append(node_data_dict)
+            if not self._flush_timer.isActive():
+                self._flush_timer.start()
+
+    @Slot()
+    def _flush_pending(self):
+        if self._pending_mqtt:
+            pending = self._pending_mqtt
+            self._pending_mqtt = []
+            self.update_nodes(pending)
 
     @Slot(bool)
     def on_loaded(self, ok: bool):
@@ -56,131 +350,117 @@ class MapWindow(QMainWindow):
             print("[MapWindow] Map HTML failed to load via QWebEngineView.")
             self.map_view.setHtml("<h1>Map Load failed</h1>")
             self._map_js_ready = False
+            self._bridge_connected = False
             self._pending_node_updates = []
 
     @Slot(list)
     def update_nodes(self, nodes: list):
         now = time.time()
+        changed_ids = set()
 
         for n_data_from_input in nodes:
-            if not isinstance(n_data_from_input, dict):
+            if type(n_data_from_input) is not dict:
                 continue
 
-            user_info_from_input = n_data_from_input.get('user', {})
-            node_id_from_input = (user_info_from_input.get('id') or
-                                  n_data_from_input.get('nodeId') or
-                                  str(uuid.uuid4()))
+            user_info_from_input = n_data_from_input.get('user')
+            node_id_from_input = user_info_from_input.get('id') if type(user_info_from_input) is dict else None
+            if not node_id_from_input:
+                node_id_from_input = n_data_from_input.get('nodeId')
+                if not node_id_from_input:
+                    node_id_from_input = _fresh_id()
+            if type(node_id_from_input) is not str:
+                node_id_from_input = str(node_id_from_input)
 
             current_node_entry = self._node_data.get(node_id_from_input, {})
-            current_node_entry.update(n_data_from_input)
+            previous_lh = current_node_entry.get('lastHeard')
+            previous_clean = current_node_entry.get('_clean_cache')
+            normalize_node(current_node_entry, n_data_from_input, node_id_from_input, now)
 
-            last_heard_val = current_node_entry.get('lastHeard')
-            sanitized_lh_map = 0.0
-            if last_heard_val is not None:
-                try:
-                    sanitized_lh_map = float(last_heard_val)
-                except (ValueError, TypeError):
-                    print(
-                        f"[MapWindow Warning] Node {node_id_from_input} had unconvertible lastHeard '{last_heard_val}'. Using 0.0.")
-            current_node_entry['lastHeard'] = sanitized_lh_map
-
-            if current_node_entry.get("active_report", False):
-                current_node_entry["lastHeard"] = now
-
-            user_info_final = current_node_entry.get('user', {})
-            if not isinstance(user_info_final, dict):
-                user_info_final = {}
-            user_info_final['id'] = node_id_from_input
-            current_node_entry['user'] = user_info_final
-
-            position_val = current_node_entry.get('position')
-            if position_val is not None:
-                if isinstance(position_val, dict):
-                    lat = position_val.get('latitude')
-                    lon = position_val.get('longitude')
-                    if lat is None or lon is None:
-                        current_node_entry.pop("position", None)
-                    else:
-                        try:
-                            current_node_entry['position']['latitude'] = float(lat)
-                            current_node_entry['position']['longitude'] = float(lon)
-                        except (ValueError, TypeError):
-                            current_node_entry.pop("position", None)
-                else:
-                    try:
-                        lat_obj = float(getattr(position_val, "latitude", math.nan))
-                        lon_obj = float(getattr(position_val, "longitude", math.nan))
-                        if math.isnan(lat_obj) or math.isnan(lon_obj):
-                            current_node_entry.pop("position", None)
-                        else:
-                            current_node_entry["position"] = {"latitude": lat_obj, "longitude": lon_obj}
-                    except (TypeError, AttributeError, ValueError):
-                        current_node_entry.pop("position", None)
+            if current_node_entry["lastHeard"] != previous_lh:
+                heapq.heappush(self._expiry_heap, (current_node_entry["lastHeard"], node_id_from_input))
 
             self._node_data[node_id_from_input] = current_node_entry
+            # Only nodes whose map-visible fields moved need to cross to JS again.
+            cleaned = current_node_entry['_clean_cache'] = clean_node_for_js(current_node_entry)
+            if cleaned != previous_clean:
+                changed_ids.add(node_id_from_input)
+
+        cutoff = now - NODE_OFFLINE_TIMEOUT_SEC
+
+        # The heap top is the oldest lastHeard, so this loop is a no-op until something expires.
+        # Entries go stale when a node is heard again; only evict if the popped timestamp is
+        # still the node's current one.
+        evicted_ids = []
+        expiry_heap = self._expiry_heap
+        while expiry_heap and expiry_heap[0][0] < cutoff:
+            lh_expired, nid = heapq.heappop(expiry_heap)
+            nd_item = self._node_data.get(nid)
+            if nd_item is not None and nd_item.get("lastHeard", 0.0) == lh_expired:
+                del self._node_data[nid]
+                evicted_ids.append(nid)
 
-        current_time_for_filter = time.time()
-        cutoff = current_time_for_filter - NODE_OFFLINE_TIMEOUT_SEC
+        if self._map_js_ready:
+            if evicted_ids:
+                self._remove_nodes(evicted_ids)
+            changed_nodes = [self._node_data[nid] for nid in changed_ids if nid in self._node_data]
+            if changed_nodes:
+                self._push_nodes_delta(changed_nodes)
+        else:
+            self._pending_node_updates = list(self._node_data.values())
 
-        filtered_node_data = {}
-        for nid, nd_item in self._node_data.items():
-            lh_to_compare = nd_item.get("lastHeard", 0.0)
+    def _push_nodes_full(self, nodes_to_push):
+        """Replaces every marker on the map with the given nodes."""
+        self._push_nodes("updateNodesFromPython", self.bridge.nodesReady, nodes_to_push)
 
-            if lh_to_compare >= cutoff:
-                filtered_node_data[nid] = nd_item
-        self._node_data = filtered_node_data
+    def _push_nodes_delta(self, changed_nodes):
+        """Upserts only the given nodes, leaving other markers untouched."""
+        self._push_nodes("updateNodesDelta", self.bridge.nodesDeltaReady, changed_nodes)
 
-        if self._map_js_ready:
-            self._push_nodes(list(self._node_data.values()))
+    def _remove_nodes(self, node_ids):
+        if self._bridge_connected:
+            self.bridge.nodesRemoved.emit(node_ids)
         else:
-            self._pending_node_updates = list(self._node_data.values())
+            self._run_js(f"removeNodes({json.dumps(node_ids)})")
 
-    def _push_nodes(self, nodes_to_push):
+    def _push_nodes(self, js_function, bridge_signal, nodes_to_push):
         clean_nodes_for_json = []
         for n_data in nodes_to_push:
-            if not isinstance(n_data, dict):
+            if type(n_data) is not dict:
                 continue
-
-            pos = n_data.get("position")
-            if not (isinstance(pos, dict) and "latitude" in pos and "longitude" in pos):
-                pos = None
-
-            raw_metrics = n_data.get("deviceMetrics") or {}
-            metrics_for_js = {}
-            if isinstance(raw_metrics, dict):
-                for k, v_val in raw_metrics.items():
-                    if isinstance(v_val, (str, int, float, bool)) or v_val is None:
-                        metrics_for_js[k] = v_val
-                    else:
-                        metrics_for_js[k] = str(v_val)
-
-            user_info_from_n_data = n_data.get("user", {})
-            if not isinstance(user_info_from_n_data, dict):
-                user_info_from_n_data = {}
-
-            cleaned = {
-                "user": {
-                    "id": user_info_from_n_data.get("id", n_data.get("nodeId", "unknown")),
-                    "longName": user_info_from_n_data.get("longName", ""),
-                    "shortName": user_info_from_n_data.get("shortName", "")
-                },
-                "position": pos,
-                "snr": n_data.get("snr"),
-                "deviceMetrics": metrics_for_js,
-                "lastHeard": n_data.get("lastHeard")
-            }
+            cleaned = n_data.get('_clean_cache')
+            if cleaned is None:
+                cleaned = n_data['_clean_cache'] = clean_node_for_js(n_data)
             clean_nodes_for_json.append(cleaned)
 
-        if not clean_nodes_for_json:
-            pass
+        if self._bridge_connected:
+            bridge_signal.emit(clean_nodes_for_json)
+            return
+
+        try:
+            if orjson is not None:
+                js_command = f"{js_function}({orjson.dumps(clean_nodes_for_json).decode()})"
+            else:
+                js_command = f"{js_function}({json.dumps(clean_nodes_for_json)})"
+        except (TypeError, ValueError) as e:
+            print(f"[MapWindow Error] Could not serialize {len(clean_nodes_for_json)} node(s) for {js_function}: {e}")
+            return
+        self._run_js(js_command)
 
-        js_command = f"updateNodesFromPython({json.dumps(clean_nodes_for_json, default=lambda o: None)})"
+    def _run_js(self, js_command):
         if self.map_view and self.map_view.page():
             try:
                 self.map_view.page().runJavaScript(js_command)
             except Exception as e:
                 print(f"[MapWindow] Error running JavaScript on map page: {e}")
 
+    @Slot()
+    def _handle_bridge_ready(self):
+        self._bridge_connected = True
+        print("[MapWindow] Map JavaScript connected over QWebChannel.")
+        if not self._map_js_ready:
+            self.map_loaded_timer.stop()
+            self._handle_map_js_ready()
+
     @Slot()
     def _handle_map_js_ready(self):
         self._map_js_ready = True
@@ -189,7 +469,7 @@ class MapWindow(QMainWindow):
             updates_to_process = list(self._pending_node_updates)
             self._pending_node_updates = []
             if updates_to_process:
-                self._push_nodes(updates_to_process)
+                self._push_nodes_full(updates_to_process)
 
     def load_initial_map(self):
         u = ""
@@ -248,136 +528,41 @@ class MapWindow(QMainWindow):
             self.map_view.setHtml("<h1>Error loading map settings</h1>")
             return
 
-        tile_js_content = f"""
-    window.nodeMarkers = {{}};
-    const styleElement = document.createElement('style');
-    styleElement.innerHTML = '.marker-ping {{ transform: scale(1.5); transition: transform 0.2s ease-out; }}';
-    document.head.appendChild(styleElement);
-
-    const customIcon = L.icon({{
-        iconUrl: 'file:///{icon_path}',
-        iconSize: [25, 41],
-        iconAnchor: [12, 41],
-        popupAnchor: [1, -34]
-    }});
-
-    var lastNodeUpdateTimes = {{}};
-
-    window.updateNodesFromPython = function(nodes) {{
-        const now = Date.now() / 1000;
-        nodes.forEach(n => {{
-            if (n.position && n.position.latitude != null && n.position.longitude != null) {{
-                const nodeId = n.user.id;
-                const coords = [n.position.latitude, n.position.longitude];
-                const name = n.user.longName || n.user.shortName || nodeId;
-                const snr = n.snr !== undefined && n.snr !== null ? n.snr.toFixed(1) : 'N/A';
-                const lat_val = parseFloat(n.position.latitude); // Ensure numbers
-                const lon_val = parseFloat(n.position.longitude);
-                const lat_str = lat_val.toFixed(5);
-                const lon_str = lon_val.toFixed(5);
-                const ts = n.lastHeard ? new Date(n.lastHeard*1000).toLocaleString() : 'N/A';
-
-                let metricsHTML = '';
-                if (n.deviceMetrics) {{
-                    const batt = n.deviceMetrics.batteryLevel;
-                    if (batt !== undefined && batt !== null) metricsHTML += '<br/><small>Batt: ' + batt + '%</small>';
-                }}
-
-                const popupHTML = '<b>' + name + '</b><br/>Lat: ' + lat_str + ', Lon: ' + lon_str + '<br/>Last Heard: ' + ts + '<br/>SNR: ' + snr + metricsHTML;
-                let marker = window.nodeMarkers[nodeId];
-
-                if (marker) {{ 
-                    marker.setLatLng(coords).setPopupContent(popupHTML); 
-                }} else {{ 
-                    marker = L.marker(coords, {{icon: customIcon}}).addTo(mymap).bindPopup(popupHTML); 
-                    window.nodeMarkers[nodeId] = marker; 
-                }}
-
-                const lastUpdateTime = lastNodeUpdateTimes[nodeId];
-                if (n.lastHeard && (lastUpdateTime === undefined || n.lastHeard > lastUpdateTime) && (now - n.lastHeard < 60)) {{
-                    if (marker.getElement()) {{
-                        marker.getElement().classList.add('marker-ping');
-                        setTimeout(() => {{
-                            if (marker.getElement()) {{ 
-                                marker.getElement().classList.remove('marker-ping'); 
-                            }}
-                        }}, 300);
-                    }}
-                }}
-                if (n.lastHeard) {{ 
-                    lastNodeUpdateTimes[nodeId] = n.lastHeard; 
-                }}
-            }}
-        }});
-    }};
-
-    var mymap = L.map('mapid').setView([{str(lat)}, {str(lon)}], {str(zoom)});
-    var tileUrl = '{u}';
-    var opts = {{maxZoom: 19, tms: false}};
-
-    if ({str(off).lower()}) {{
-        var p = encodeURIComponent('{d}').replace(/%2F/g, '/');
-        tileUrl = 'file:///' + p + '/{{z}}/{{x}}/{{y}}.png';
-    }}
-    L.tileLayer(tileUrl, opts).addTo(mymap);
-    console.log("Leaflet map initialized with tileUrl:", tileUrl);
-
-    // Simpler ready signal for Python
-    if(typeof qt !== 'undefined' && typeof qt.webChannelTransport !== 'undefined') {{
-        new QWebChannel(qt.webChannelTransport, function(channel) {{
-            window.pyJsBridge = channel.objects.pyJsBridge;
-            if(window.pyJsBridge) {{
-                console.log('Map JS: pyJsBridge available, signaling mapJsReady');
-                window.pyJsBridge.mapJsIsReady();
-            }} else {{
-                console.error('Map JS: pyJsBridge object not found on channel.');
-            }}
-        }});
-    }} else {{
-         // Fallback if QWebChannel is not set up by Python side for this specific call yet
-         // This relies on the Python-side timer in on_loaded.
-        console.log('Map JS: QWebChannel not immediately available. Python timer will handle readiness.');
-    }}
-    """
-
-        html_page_string = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8"/>
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
-    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-    <style>
-        html, body, #mapid {{ height: 100%; margin: 0; padding: 0; }}
-        .marker-ping {{ transform: scale(1.5); transition: transform 0.2s ease-out; }}
-    </style>
-    <script>
-        window.onerror = function(msg, url, line, col, error) {{
-            console.error("JS Error:", msg, "URL:", url, "Line:", line, "Col:", col, "Error Obj:", error);
-            if (window.pyJsBridge && window.pyJsBridge.logError) {{
-                window.pyJsBridge.logError("JS Error: " + msg + " URL:" + url + " Line:" + line);
-            }}
-            return false; // Prevent default browser handling
-        }};
-    </script>
-</head>
-<body>
-    <div id="mapid"></div>
-    <script>
-        {tile_js_content}
-    </script>
-</body>
-</html>"""
+        template_values = {
+            "icon_path": icon_path,
+            "lat": str(lat),
+            "lon": str(lon),
+            "zoom": str(zoom),
+            "tile_url": u,
+            "offline": str(off).lower(),
+            "offline_dir": d,
+        }
+        settings_hash = hashlib.blake2b(json.dumps(template_values, sort_keys=True).encode("utf-8"),
+                                        digest_size=8, key=_MAP_TEMPLATE_DIGEST).hexdigest()
 
         tmp_dir = os.path.join(
             QStandardPaths.writableLocation(QStandardPaths.TempLocation),
             QCoreApplication.applicationName() or "MIM", "map"
         )
         os.makedirs(tmp_dir, exist_ok=True)
-        map_file_path = os.path.join(tmp_dir, "map.html")
+        map_file_path = os.path.join(tmp_dir, f"map.{settings_hash}.html")
 
         try:
-            with open(map_file_path, "w", encoding="utf-8") as f:
-                f.write(html_page_string)
+            if not os.path.exists(map_file_path):
+                html_page_string = _HTML_SHELL.format(js=_MAP_JS_TEMPLATE.substitute(template_values))
+                # Written beside the target and swapped in, so an interrupted write never leaves a
+                # truncated page behind for later starts to reuse.
+                tmp_path = f"{map_file_path}.{os.getpid()}.tmp"
+                try:
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        f.write(html_page_string)
+                    os.replace(tmp_path, map_file_path)
+                except BaseException:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                    raise
 
             try:
                 self.map_view.loadFinished.disconnect(self.on_loaded)
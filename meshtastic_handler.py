@@ -1,10 +1,15 @@
+import collections
+import functools
+import logging
+import queue
+import sys
 import threading
 import time
-import traceback
+from types import MappingProxyType
 import meshtastic
-import meshtastic.serial_interface
-import meshtastic.tcp_interface
 from meshtastic import mesh_interface
+from meshtastic.serial_interface import SerialInterface
+from meshtastic.tcp_interface import TCPInterface
 from meshtastic.protobuf.mesh_pb2 import MeshPacket
 from meshtastic.protobuf.portnums_pb2 import PortNum
 
@@ -16,467 +21,654 @@ except ImportError:
     print("Please install it: pip install pypubsub")
     pub = None
 
-from PySide6.QtCore import QObject, Signal, Slot, QTimer
+from PySide6.QtCore import QMetaObject, QObject, Qt, Signal, Slot, QTimer
 from sound_utils import play_sound_async
 
-callback_counter = {"established": 0, "lost": 0, "receive": 0}
+logger = logging.getLogger(__name__)
+
 BROADCAST_ADDR_INT = 0xffffffff
 BROADCAST_ADDR_STR = "^all"
+_TEXT_MESSAGE_APP = sys.intern("TEXT_MESSAGE_APP")
+_TEXT_MESSAGE_APP_NUM = int(PortNum.TEXT_MESSAGE_APP)
 NODE_ACTIVE_TIMEOUT_SEC = 60 * 5  # 5 minutes
+NODE_LIST_THROTTLE_MS = 200
+MY_INFO_POLL_MS = 100
+MY_INFO_POLL_ATTEMPTS = 5
+RX_BATCH_FLUSH_MS = 20
+RX_BUFFER_MAX = 4096  # Oldest texts are dropped past this if the UI thread stalls.
+NODE_DELTA_FLUSH_MS = 500
+TX_QUEUE_MAX = 64
+TX_COALESCE_WINDOW_SEC = 0.01
+TX_COALESCE_MAX_ITEMS = 16
+TX_COALESCE_MAX_BYTES = 200  # Stays under the 233-byte LoRa data payload.
+_EMPTY_MAPPING = MappingProxyType({})  # Shared default for .get() lookups on the hot paths.
+_EMPTY_NODES = _EMPTY_MAPPING
+_NO_IDS = frozenset()
+
+# conn_type -> (factory taking the details string, error raised when details are empty)
+_CONN_FACTORIES = {
+    'Serial': (lambda d: SerialInterface(devPath=d),
+               "Serial port not specified."),
+    'Network (IP)': (lambda d: TCPInterface(hostname=d),
+                     "Network IP/Hostname not specified."),
+}
+
+# The library publishes on fixed, process-wide topics. One module-level listener on the root
+# topic hands each event to the handler that owns the publishing interface, keyed by id(interface).
+_REGISTRY = {}
+_dispatchers_subscribed = False
+
+
+def _dispatch_receive(packet, interface):
+    handler = _REGISTRY.get(id(interface))
+    if handler is not None:
+        handler._on_receive_packet(packet, interface)
+
+
+def _dispatch_connection_established(interface):
+    handler = _REGISTRY.get(id(interface))
+    if handler is not None:
+        handler._on_connection_established(interface)
+
+
+def _dispatch_connection_lost(interface):
+    handler = _REGISTRY.get(id(interface))
+    if handler is not None:
+        handler._on_connection_lost(interface)
+
+
+def _dispatch_node_updated(node, interface):
+    handler = _REGISTRY.get(id(interface))
+    if handler is not None:
+        handler._on_node_updated(node, interface)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_to_id(raw_to_id):
+    """Maps a packet's toId ('!hex', '^all', a plain number or an int) to a node number."""
+    if type(raw_to_id) is int:
+        return raw_to_id
+    if type(raw_to_id) is not str:
+        return BROADCAST_ADDR_INT
+    try:
+        if raw_to_id[:1] == '!':
+            return int(raw_to_id[1:], 16)
+        if raw_to_id == BROADCAST_ADDR_STR:
+            return BROADCAST_ADDR_INT
+        return int(raw_to_id)
+    except ValueError:
+        return BROADCAST_ADDR_INT
+
+
+def _sanitize_last_heard(value):
+    """Returns lastHeard as a float, 0.0 when missing or unparseable."""
+    if type(value) is float:
+        return value
+    try:
+        return float(value or 0.0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _freeze_nodes(nodes):
+    return tuple(MappingProxyType(node) for node in nodes.values())
+
+
+def _coalesce_texts(items):
+    """Joins consecutive texts for the same destination and channel while they fit one payload."""
+    merged = []
+    for destination_id, text, channel_index in items:
+        if merged:
+            last_destination_id, last_text, last_channel_index = merged[-1]
+            if (last_destination_id == destination_id and last_channel_index == channel_index and
+                    len(last_text.encode("utf-8")) + 1 + len(text.encode("utf-8")) <= TX_COALESCE_MAX_BYTES):
+                merged[-1] = (destination_id, last_text + "\n" + text, channel_index)
+                continue
+        merged.append((destination_id, text, channel_index))
+    return merged
+
+
+_RECEIVE_TOPIC = "meshtastic.receive"
+_TOPIC_DISPATCHERS = {
+    "meshtastic.connection.established": _dispatch_connection_established,
+    "meshtastic.connection.lost": _dispatch_connection_lost,
+    "meshtastic.node.updated": _dispatch_node_updated,
+}
+
+
+def _dispatch_event(topic=pub.AUTO_TOPIC, **msgdata):
+    """Single listener on the 'meshtastic' root topic; routes by the published topic name."""
+    topic_name = topic.getName()
+    # Packets arrive on meshtastic.receive or one of its per-portnum subtopics (.text, .position, ...).
+    if topic_name.startswith(_RECEIVE_TOPIC):
+        _dispatch_receive(**msgdata)
+        return
+    dispatcher = _TOPIC_DISPATCHERS.get(topic_name)
+    if dispatcher is not None:
+        dispatcher(**msgdata)
+
+
+def _subscribe_dispatchers():
+    global _dispatchers_subscribed
+    if _dispatchers_subscribed:
+        return
+    pub.subscribe(_dispatch_event, "meshtastic")
+    _dispatchers_subscribed = True
+    logger.info("PubSub dispatcher registered")
 
 
 class MeshtasticHandler(QObject):
     connection_status = Signal(bool, str)
     message_received = Signal(str, str, str, str)
-    node_list_updated = Signal(list)
+    messages_received_batch = Signal(list)
+    # Tuple of read-only MappingProxyType views over the node dicts.
+    node_list_updated = Signal(tuple)
+    node_updated = Signal(dict)
+    # Nodes that just became active, batched per NODE_DELTA_FLUSH_MS; receivers merge by node id.
+    node_list_delta = Signal(list)
     channel_list_updated = Signal(list)
+    message_send_failed = Signal(str, str)
 
     _connection_established_signal = Signal()
+    _rx_pending_signal = Signal()
+    _nodes_dirty_signal = Signal()
 
     def __init__(self, connection_settings, parent=None):
         super().__init__(parent)
         if pub is None:
              raise RuntimeError("PyPubSub not loaded. Meshtastic Handler cannot operate.")
 
-        self.settings = connection_settings
+        self.reconfigure(connection_settings)
         self.meshtastic_interface: mesh_interface.MeshInterface | None = None
         self.is_running = False
-        self._nodes = {}
-        self._subscribed_to_pubsub = False
+        # Read-only snapshot, replaced wholesale by writers so readers never see a half-rebuilt
+        # table without taking a lock. Writers serialize on _nodes_write_lock; the node dicts
+        # inside are still updated in place.
+        self._nodes = _EMPTY_NODES
+        self._nodes_write_lock = threading.Lock()
+        # sender_id -> display name; dropped whenever the node behind it may have changed.
+        self._display_names = {}
         self._my_node_num = None
-
-        print("[Meshtastic Handler] Initialized.")
-
+        self._my_node_id_str = None
+        # Every string form our own node id may take in packets ('!%x' and the library's '!%08x').
+        self._my_ids = _NO_IDS
+        # Interface whose connection-established handling is still waiting on myInfo.
+        self._established_interface = None
+        self._my_info_attempts = 0
+        # Debug-only counts of connection callbacks seen by this handler.
+        self._established_count = 0
+        self._lost_count = 0
+
+        # Bound once; these fire from the receive, connection and node refresh paths.
+        self._emit_status = self.connection_status.emit
+        self._emit_message = self.message_received.emit
+        self._emit_nodes = self.node_list_updated.emit
+
+        # Handlers take (packet, decoded, from_id) as already read by _on_receive_packet.
+        # Keyed by both the portnum name the library puts in packet dicts and the enum value.
+        self._port_handlers = {
+            _TEXT_MESSAGE_APP: self._handle_text_message,
+            _TEXT_MESSAGE_APP_NUM: self._handle_text_message,
+        }
+
+        self._node_list_force = False
+        self._last_nodes_sig = None
+        self._node_list_timer = QTimer(self)
+        self._node_list_timer.setSingleShot(True)
+        self._node_list_timer.setInterval(NODE_LIST_THROTTLE_MS)
+        self._node_list_timer.timeout.connect(self._flush_node_list_request)
+
+        # Text messages arrive on the meshtastic publishing thread (the only producer) and are
+        # drained on the Qt thread (the only consumer). deque append/popleft are atomic, so the
+        # buffer needs no lock: the drain loops until empty, and a producer that finds it empty
+        # after appending signals a new flush.
+        self._rx_buffer = collections.deque(maxlen=RX_BUFFER_MAX)
+        self._rx_flush_timer = QTimer(self)
+        self._rx_flush_timer.setSingleShot(True)
+        self._rx_flush_timer.setInterval(RX_BATCH_FLUSH_MS)
+        self._rx_flush_timer.timeout.connect(self._flush_rx_buffer)
+        self._rx_pending_signal.connect(self._start_rx_flush_timer)
+
+        # Node ids whose active_report flipped on: _dirty_nodes is drained by _flush_node_delta on
+        # the Qt thread, _active_ids by reset_active_flags. Both are guarded by _dirty_lock.
+        self._dirty_lock = threading.Lock()
+        self._dirty_nodes = set()
+        self._active_ids = set()
+        self._node_delta_timer = QTimer(self)
+        self._node_delta_timer.setSingleShot(True)
+        self._node_delta_timer.setInterval(NODE_DELTA_FLUSH_MS)
+        self._node_delta_timer.timeout.connect(self._flush_node_delta)
+        self._nodes_dirty_signal.connect(self._start_node_delta_timer)
+
+        # Outgoing texts are written by a per-connection daemon thread so serial/TCP
+        # latency never blocks the Qt thread.
+        self._tx_q = None
+        self._tx_thread = None
+        # close() flushes the port and joins the library's reader thread, so it runs off the
+        # calling thread; _closing_lock makes taking the interface to close atomic.
+        self._closing_lock = threading.Lock()
+        self._close_thread = None
+
+        logger.debug("Initialized")
+
+    def reconfigure(self, connection_settings):
+        """Swaps in new connection settings; takes effect on the next connect_to_device()."""
+        self.settings = connection_settings
+        self._conn_type = connection_settings.get('mesh_conn_type', 'None')
+        self._conn_details = connection_settings.get('mesh_details', '')
 
     def _on_receive_packet(self, packet, interface):
-        global callback_counter
-        callback_counter["receive"] += 1
-
-        if interface != self.meshtastic_interface:
+        try:
+            from_id = packet.get('fromId')
+            decoded = packet.get('decoded')
+        except AttributeError:
+            logger.warning("Rx: unexpected packet type %s", type(packet).__name__)
             return
 
+        nodes = self._nodes
+        if from_id in nodes and from_id not in self._my_ids:
+            node = nodes[from_id]
+            node['lastHeard'] = time.time()
+            if not node.get('active_report'):
+                node['active_report'] = True
+                self._mark_node_active(from_id)
 
-        if not isinstance(packet, dict):
-            print(f"[Meshtastic Rx Warning] Unexpected packet type: {type(packet).__name__}")
+        # Packets we could not decode only count as activity from their sender.
+        if not decoded:
             return
-
-        from_id = packet.get('fromId')
-        to_id = packet.get('toId')
-        channel = packet.get('channel', 0)
-
-        my_node_id_str = None
-        if self.meshtastic_interface and self.meshtastic_interface.myInfo:
-            if self._my_node_num is not None:
-                my_node_id_str = f"!{self._my_node_num:x}"
-            elif hasattr(self.meshtastic_interface.myInfo, 'node_num_str'):
-                my_node_id_str = self.meshtastic_interface.myInfo.node_num_str
-
-        if from_id and from_id in self._nodes and (my_node_id_str is None or from_id != my_node_id_str):
-            self._nodes[from_id]['lastHeard'] = time.time()
-            self._nodes[from_id]['active_report'] = True
-
-
-        decoded = packet.get('decoded', {})
-
         if 'text' in decoded:
-            self._handle_text_message(packet, interface)
-            return
-
-        port_num_val = decoded.get('portnum')
-        if port_num_val is None:
-            port_num_val = packet.get('portnum')
-
-        if port_num_val is None:
+            self._handle_text_message(packet, decoded, from_id)
             return
-
-        if port_num_val == PortNum.TEXT_MESSAGE_APP:
-            self._handle_text_message(packet, interface)
-        elif port_num_val == PortNum.POSITION_APP:
-            pass
-        elif port_num_val == PortNum.TELEMETRY_APP:
-            pass
-        elif port_num_val == PortNum.ROUTING_APP:
-            pass
-        else:
-            pass
+        port_handler = self._port_handlers.get(decoded.get('portnum'))
+        if port_handler is not None:
+            port_handler(packet, decoded, from_id)
 
     @Slot()
     def connect_to_device(self):
-        conn_type = self.settings.get('mesh_conn_type', 'None')
-        details = self.settings.get('mesh_details', '')
-        print(f"[Meshtastic Handler] connect_to_device called: type='{conn_type}', details='{details}'")
+        conn_type = self._conn_type
+        details = self._conn_details
+        logger.info("connect_to_device: type=%r details=%r", conn_type, details)
 
         if self.meshtastic_interface and self.is_running:
-            print("[Meshtastic Handler] Interface already exists and is running.")
-            QTimer.singleShot(0, lambda: self.connection_status.emit(True, "Already connected"))
+            logger.info("Interface already exists and is running")
+            QMetaObject.invokeMethod(self, "_emit_already_connected", Qt.QueuedConnection)
             QTimer.singleShot(100, self.request_channel_list)
             return True
 
         if self.meshtastic_interface:
-            print("[Meshtastic Handler] Cleaning up previous interface before reconnecting.")
+            logger.info("Cleaning up previous interface before reconnecting")
             self.disconnect()
 
         try:
-            print("[Meshtastic Handler] Creating interface...")
-            if conn_type == 'Serial':
-                if not details: raise ValueError("Serial port not specified.")
-                print(f"[Meshtastic Handler] Creating SerialInterface for {details}...")
-                self.meshtastic_interface = meshtastic.serial_interface.SerialInterface(devPath=details)
-            elif conn_type == 'Network (IP)':
-                if not details: raise ValueError("Network IP/Hostname not specified.")
-                print(f"[Meshtastic Handler] Creating TCPInterface for {details}...")
-                self.meshtastic_interface = meshtastic.tcp_interface.TCPInterface(hostname=details)
-            else:
+            conn_factory = _CONN_FACTORIES.get(conn_type)
+            if conn_factory is None:
                 err_msg = "Connection type is None." if conn_type == 'None' else f"Unknown connection type: {conn_type}"
-                print(f"[Meshtastic Handler] {err_msg}")
-                self.connection_status.emit(False, err_msg)
+                logger.info(err_msg)
+                self._emit_status(False, err_msg)
                 return False
 
-            print("[Meshtastic Handler] Interface object created.")
-
-            if not self._subscribed_to_pubsub:
-                print("[Meshtastic Handler] Subscribing to PyPubSub topics...")
-                global callback_counter
-                callback_counter = {"established": 0, "lost": 0, "receive": 0}
-                pub.subscribe(self._on_receive_packet, "meshtastic.receive")
-                pub.subscribe(self._on_connection_established, "meshtastic.connection.established")
-                pub.subscribe(self._on_connection_lost, "meshtastic.connection.lost")
-                self._subscribed_to_pubsub = True
-                print("[Meshtastic Handler] PubSub subscriptions registered.")
-            else:
-                print("[Meshtastic Handler] PubSub already subscribed.")
+            factory, missing_details_msg = conn_factory
+            if not details: raise ValueError(missing_details_msg)
+            close_thread = self._close_thread
+            if close_thread is not None and close_thread.is_alive():
+                # Let the previous interface release the port before opening it again.
+                close_thread.join(timeout=5.0)
+            logger.info("Creating %s interface for %s", conn_type, details)
+            self.meshtastic_interface = factory(details)
+
+            self._start_tx_thread(self.meshtastic_interface)
 
-            print("[Meshtastic Handler] connect_to_device sequence initiated. Waiting for connection events...")
+            _subscribe_dispatchers()
+            _REGISTRY[id(self.meshtastic_interface)] = self
+
+            logger.info("Interface created, waiting for connection events")
             return True
 
         except Exception as e:
-            error_type = type(e).__name__
-            error_msg = f"Connection failed during setup ({error_type}): {e}"
-            print(f"[Meshtastic Handler] {error_msg}")
-            traceback.print_exc()
+            logger.exception("Connection failed during setup")
+            error_msg = f"Connection failed during setup ({type(e).__name__}): {e}"
             self.disconnect()
-            self.connection_status.emit(False, error_msg)
+            self._emit_status(False, error_msg)
             return False
 
     @Slot()
     def disconnect(self):
-        print("[Meshtastic Handler] disconnect() called.")
+        logger.info("Disconnecting")
         self.is_running = False
         self._my_node_num = None
+        self._my_node_id_str = None
+        self._my_ids = _NO_IDS
+        self._stop_tx_thread()
 
-        if self._subscribed_to_pubsub:
-            print("[Meshtastic Handler] Unsubscribing from PyPubSub...")
-            try:
-                if pub:
-                    try: pub.unsubscribe(self._on_receive_packet, "meshtastic.receive")
-                    except Exception as e: print(f"  -Warn unsub receive: {e}")
-                    try: pub.unsubscribe(self._on_connection_established, "meshtastic.connection.established")
-                    except Exception as e: print(f"  -Warn unsub established: {e}")
-                    try: pub.unsubscribe(self._on_connection_lost, "meshtastic.connection.lost")
-                    except Exception as e: print(f"  -Warn unsub lost: {e}")
-                    print("[Meshtastic Handler] PubSub unsubscribe attempt finished.")
-                else:
-                    print("[Meshtastic Handler Warning] Cannot unsubscribe, pubsub not loaded.")
-                self._subscribed_to_pubsub = False
-            except Exception as unsub_err:
-                print(f"[Meshtastic Warning] Error during PubSub unsubscribe block: {unsub_err}")
-
-        if self.meshtastic_interface:
-            print("[Meshtastic Handler] Closing interface...")
+        with self._closing_lock:
             interface_to_close = self.meshtastic_interface
             self.meshtastic_interface = None
-            try:
-                interface_to_close.close()
-                print("[Meshtastic Handler] Interface closed.")
-            except Exception as e:
-                print(f"[Meshtastic Handler] Error during interface close: {e}")
-        else:
-            print("[Meshtastic Handler] No active interface to close.")
+        if interface_to_close is not None and _REGISTRY.get(id(interface_to_close)) is self:
+            del _REGISTRY[id(interface_to_close)]
 
-        self._nodes = {}
-        print("[Meshtastic Handler] Disconnect process finished.")
+        if interface_to_close:
+            self._close_thread = threading.Thread(target=self._close_interface, args=(interface_to_close,),
+                                                  name="MeshtasticClose")
+            self._close_thread.start()
+        else:
+            logger.info("No active interface to close")
+
+        with self._nodes_write_lock:
+            self._nodes = _EMPTY_NODES
+        self._display_names.clear()
+        # Texts still waiting for the RX flush belong to the session being torn down.
+        self._rx_buffer.clear()
+        with self._dirty_lock:
+            self._dirty_nodes.clear()
+            self._active_ids.clear()
+        self._last_nodes_sig = None
+
+    @staticmethod
+    def _close_interface(interface):
+        try:
+            interface.close()
+            logger.info("Interface closed")
+        except Exception as e:
+            logger.warning("Error during interface close: %s", e)
 
     def _on_connection_established(self, interface, topic=pub.AUTO_TOPIC):
-        global callback_counter
-        callback_counter["established"] += 1
-        print(f"[Meshtastic Handler CB] _on_connection_established CALLED ({callback_counter['established']})")
+        if logger.isEnabledFor(logging.DEBUG):
+            self._established_count += 1
+            logger.debug("_on_connection_established called (%d)", self._established_count)
 
-        if interface == self.meshtastic_interface:
-            print("[Meshtastic Handler CB] Connection established event matches current interface.")
+        if interface is self.meshtastic_interface:
+            logger.debug("Connection established event matches current interface")
             self.is_running = True
             self._my_node_num = None
-            try:
-                time.sleep(0.5)
-                if interface.myInfo and hasattr(interface.myInfo, 'my_node_num'):
-                    self._my_node_num = interface.myInfo.my_node_num
-                    print(f"[Meshtastic Handler CB] Successfully obtained My Node Number: {self._my_node_num:#010x} ({self._my_node_num})")
-                else:
-                    print("[Meshtastic Handler CB Warning] interface.myInfo or my_node_num attribute not available after delay.")
-            except Exception as e:
-                 print(f"[Meshtastic Handler CB Warning] Could not get own node number: {e}")
-
-            print("[Meshtastic Handler CB] Playing sign-on sound.")
-            play_sound_async("signon.wav")
-            self.connection_status.emit(True, "Connected")
-            print("[Meshtastic Handler CB] Emitting _connection_established_signal.")
-            self._connection_established_signal.emit()
+            self._my_node_id_str = None
+            self._my_ids = _NO_IDS
+            self._established_interface = interface
+            self._my_info_attempts = MY_INFO_POLL_ATTEMPTS
+            # This runs on the meshtastic publishing thread, which also delivers received packets;
+            # waiting for myInfo happens on the Qt thread instead.
+            QMetaObject.invokeMethod(self, "_finish_connection_established", Qt.QueuedConnection)
         else:
-            print("[Meshtastic Warning] Connection established event for unexpected/old interface. Ignoring.")
+            logger.warning("Connection established event for unexpected/old interface, ignoring")
+
+    @Slot()
+    def _finish_connection_established(self):
+        interface = self._established_interface
+        if interface is None or interface is not self.meshtastic_interface:
+            return
+        try:
+            my_node_num = getattr(getattr(interface, 'myInfo', None), 'my_node_num', None)
+            if my_node_num is None and self._my_info_attempts > 0:
+                self._my_info_attempts -= 1
+                QTimer.singleShot(MY_INFO_POLL_MS, self._finish_connection_established)
+                return
+            if my_node_num is not None:
+                # Normalized once here so the receive path can compare plain ints.
+                if isinstance(my_node_num, str) and my_node_num.startswith('!'):
+                    my_node_num = int(my_node_num[1:], 16)
+                self._my_node_num = int(my_node_num)
+                # The library keys nodes by zero-padded '!%08x' ids.
+                self._my_node_id_str = f"!{self._my_node_num:08x}"
+                self._my_ids = frozenset((self._my_node_id_str, f"!{self._my_node_num:x}"))
+                logger.info("My node number: %#010x (%d)", self._my_node_num, self._my_node_num)
+            else:
+                logger.warning("interface.myInfo or my_node_num not available after delay")
+        except Exception as e:
+             logger.warning("Could not get own node number: %s", e)
+
+        self._established_interface = None
+        self._emit_status(True, "Connected")
+        play_sound_async("signon.wav")
+        self._connection_established_signal.emit()
+
+    @Slot()
+    def _emit_already_connected(self):
+        self._emit_status(True, "Already connected")
 
     def _on_connection_lost(self, interface, topic=pub.AUTO_TOPIC):
-        global callback_counter
-        callback_counter["lost"] += 1
-        print(f"[Meshtastic Handler CB] _on_connection_lost CALLED ({callback_counter['lost']})")
+        if logger.isEnabledFor(logging.DEBUG):
+            self._lost_count += 1
+            logger.debug("_on_connection_lost called (%d)", self._lost_count)
 
-        if interface == self.meshtastic_interface:
-            print("[Meshtastic Handler CB] Connection lost event matches current interface.")
+        if interface is self.meshtastic_interface:
             if self.is_running:
-                print("[Meshtastic Handler CB] Was running, emitting status and triggering disconnect.")
-                self.connection_status.emit(False, "Connection Lost")
+                logger.info("Connection lost, disconnecting")
+                self._emit_status(False, "Connection Lost")
                 self.disconnect()
             else:
-                print("[Meshtastic Handler CB] Connection lost event received, but already not running.")
+                logger.debug("Connection lost event received while not running")
                 self.disconnect()
         else:
-             print("[Meshtastic Warning] Connection lost event for unexpected/old interface. Ignoring.")
+             logger.warning("Connection lost event for unexpected/old interface, ignoring")
 
-    def _handle_text_message(self, packet, interface):
-        sender_id = packet.get('fromId', 'Unknown')
-        text = packet.get('decoded', {}).get('text', '')
+    def _on_node_updated(self, node, interface):
+        if not isinstance(node, dict):
+            return
+        node_id = node.get('user', _EMPTY_MAPPING).get('id')
+        if not node_id:
+            return
+
+        node['lastHeard'] = _sanitize_last_heard(node.get('lastHeard'))
+        existing = self._nodes.get(node_id)
+        # The library usually updates its node dict in place; the snapshot already references
+        # it then, so only a new dict for this id needs the copy-and-swap.
+        if existing is not node:
+            node['active_report'] = (existing or _EMPTY_MAPPING).get('active_report', False)
+            with self._nodes_write_lock:
+                if interface is not self.meshtastic_interface:
+                    return
+                new_nodes = dict(self._nodes)
+                new_nodes[node_id] = node
+                self._nodes = MappingProxyType(new_nodes)
+        self._display_names.pop(node_id, None)
+        self.node_updated.emit(node)
+
+    def _handle_text_message(self, packet, decoded, from_id):
+        sender_id = from_id or 'Unknown'
+        text = decoded.get('text')
 
         if not text:
-            print("[Meshtastic Rx Warning] Received empty text message payload in decoded part.")
+            logger.warning("Rx: empty text message payload in decoded part")
             return
 
-        display_name = sender_id
-        if sender_id in self._nodes:
-            node_info = self._nodes[sender_id]
-            user_info = node_info.get('user', {})
-            long_name = user_info.get('longName')
-            short_name = user_info.get('shortName')
-            if long_name:
-                display_name = long_name
-            elif short_name:
-                display_name = short_name
-        print(f"[Meshtastic Rx Proc] Resolved sender: ID={sender_id}, DisplayName='{display_name}'")
+        display_name = self._display_names.get(sender_id)
+        if display_name is None:
+            display_name = sender_id
+            node_info = self._nodes.get(sender_id)
+            if node_info is not None:
+                user_info = node_info.get('user', _EMPTY_MAPPING)
+                display_name = user_info.get('longName') or user_info.get('shortName') or sender_id
+            self._display_names[sender_id] = display_name
+            logger.debug("Rx: resolved sender %s as %r", sender_id, display_name)
 
         raw_to_id = packet.get('toId')
-        to_id = BROADCAST_ADDR_INT
-
-        if raw_to_id is not None:
-            if isinstance(raw_to_id, int):
-                to_id = raw_to_id
-            elif isinstance(raw_to_id, str):
-                if raw_to_id.startswith('!'):
-                    try:
-                        to_id = int(raw_to_id[1:], 16)
-                        print(f"[Meshtastic Rx Proc] Converted to_id string '{raw_to_id}' to int {to_id:#010x}")
-                    except ValueError:
-                        print(
-                            f"[Meshtastic Rx Warning] Invalid hex format for to_id string '{raw_to_id}'. Defaulting to broadcast.")
-                        to_id = BROADCAST_ADDR_INT
-                elif raw_to_id == '^all':
-                    to_id = BROADCAST_ADDR_INT
-                    print(f"[Meshtastic Rx Proc] Converted to_id string '^all' to int {to_id:#010x}")
-                else:
-                    try:
-                        to_id = int(raw_to_id)
-                        print(f"[Meshtastic Rx Proc] Converted plain to_id string '{raw_to_id}' to int {to_id}")
-                    except ValueError:
-                        print(
-                            f"[Meshtastic Rx Warning] Unrecognized to_id string format '{raw_to_id}'. Defaulting to broadcast.")
-                        to_id = BROADCAST_ADDR_INT
-            else:
-                print(
-                    f"[Meshtastic Rx Warning] Unexpected type for to_id '{raw_to_id}' ({type(raw_to_id).__name__}). Defaulting to broadcast.")
-                to_id = BROADCAST_ADDR_INT
-        else:
-            print("[Meshtastic Rx Info] to_id missing from packet. Assuming broadcast.")
-            to_id = BROADCAST_ADDR_INT
+        to_id = raw_to_id if type(raw_to_id) is int else _parse_to_id(raw_to_id)
 
         channel_index = packet.get('channel', 0)
 
-        my_node_num_str = f"{self._my_node_num:#010x} ({self._my_node_num})" if self._my_node_num is not None else "None"
-        print(
-            f"[Meshtastic Rx Proc] Raw Packet Info: From={sender_id}, To={to_id:#010x} ({to_id}), Ch={channel_index}, MyNode={my_node_num_str}, Text='{text}'")
-
-        print(
-            f"[Meshtastic Rx DEBUG] Comparing as numbers: to_id={to_id} (type={type(to_id).__name__}), my_node_num={self._my_node_num} (type={type(self._my_node_num).__name__})")
+        my_node_num = self._my_node_num
+        logger.debug("Rx: from=%s to=%#010x ch=%s my_node=%s text=%r",
+                     sender_id, to_id, channel_index, my_node_num, text)
 
-        my_node_num_int = None
-        if self._my_node_num is not None:
-            try:
-                if isinstance(self._my_node_num, str) and self._my_node_num.startswith('!'):
-                    my_node_num_int = int(self._my_node_num[1:], 16)
-                else:
-                    my_node_num_int = int(self._my_node_num)
-            except (ValueError, TypeError):
-                print(f"[Meshtastic Rx Warning] Could not convert my_node_num '{self._my_node_num}' to integer.")
-
-        is_direct = False
-        if my_node_num_int is not None:
-            is_direct = (to_id == my_node_num_int)
-            print(
-                f"[Meshtastic Rx DEBUG] Direct comparison result: {is_direct} (compared {to_id} == {my_node_num_int})")
-
-        is_explicit_broadcast = (to_id == BROADCAST_ADDR_INT)
-        is_primary_channel = (channel_index == 0)
-
-        msg_type = None
-        if is_direct:
+        # my_node_num is normalized to an int on connect, so both tests are plain int compares.
+        if my_node_num is not None and to_id == my_node_num:
             msg_type = 'direct'
-            print(f"[Meshtastic Rx Proc] Classified as: DIRECT (Comparison Result: {is_direct})")
-        elif is_primary_channel and is_explicit_broadcast:
+        elif channel_index == 0 and to_id == BROADCAST_ADDR_INT:
             msg_type = 'broadcast'
-            print(f"[Meshtastic Rx Proc] Classified as: BROADCAST (Ch=0 and ToId=BroadcastAddr)")
         else:
-            print(
-                f"[Meshtastic Rx Proc] Ignoring message: Not direct to self or primary channel broadcast (To: {to_id:#010x}, Ch: {channel_index})")
+            logger.debug("Rx: ignoring message not direct to us or primary broadcast (to=%#010x, ch=%s)",
+                         to_id, channel_index)
             return
 
-        if sender_id in self._nodes:
-            self._nodes[sender_id]['active_report'] = True
-            self._nodes[sender_id]['lastHeard'] = time.time()
-            print(f"[Meshtastic Rx] Marked node {sender_id} as active after receiving message")
+        logger.debug("Rx: queuing %s message from %s (%r)", msg_type, sender_id, display_name)
+        rx_buffer = self._rx_buffer
+        rx_buffer.append((sender_id, display_name, text, msg_type))
+        if len(rx_buffer) == 1:
+            self._rx_pending_signal.emit()
 
-        if msg_type == 'broadcast':
-            print(
-                f"[Meshtastic Rx Proc] Emitting 'broadcast' message: SenderID={sender_id}, DisplayName='{display_name}', Text='{text[:20]}...'")
-            self.message_received.emit(sender_id, display_name, text, 'broadcast')
-        elif msg_type == 'direct':
-            print(
-                f"[Meshtastic Rx Proc] Emitting 'direct' message: SenderID={sender_id}, DisplayName='{display_name}', Text='{text[:20]}...'")
-            self.message_received.emit(sender_id, display_name, text, 'direct')
+    def _mark_node_active(self, node_id):
+        with self._dirty_lock:
+            self._active_ids.add(node_id)
+            self._dirty_nodes.add(node_id)
+            first_dirty = len(self._dirty_nodes) == 1
+        if first_dirty:
+            self._nodes_dirty_signal.emit()
 
+    @Slot()
+    def _start_node_delta_timer(self):
+        if not self._node_delta_timer.isActive():
+            self._node_delta_timer.start()
 
     @Slot()
-    def request_node_list(self):
+    def _flush_node_delta(self):
+        with self._dirty_lock:
+            dirty, self._dirty_nodes = self._dirty_nodes, set()
+        nodes = self._nodes
+        delta = [nodes[node_id] for node_id in dirty if node_id in nodes]
+        if delta:
+            self.node_list_delta.emit(delta)
+
+    @Slot()
+    def _start_rx_flush_timer(self):
+        if not self._rx_flush_timer.isActive():
+            self._rx_flush_timer.start()
+
+    @Slot()
+    def _flush_rx_buffer(self):
+        rx_buffer = self._rx_buffer
+        popleft = rx_buffer.popleft
+        batch = []
+        while rx_buffer:
+            batch.append(popleft())
+        if len(batch) == 1:
+            self._emit_message(*batch[0])
+        elif batch:
+            self.messages_received_batch.emit(batch)
+
+    @Slot()
+    def schedule_node_list(self, force=False):
+        """Coalesces bursts of node list requests into one request_node_list() per throttle interval."""
+        self._node_list_force = self._node_list_force or force
+        if not self._node_list_timer.isActive():
+            self._node_list_timer.start()
+
+    @Slot()
+    def _flush_node_list_request(self):
+        force = self._node_list_force
+        self._node_list_force = False
+        if self.meshtastic_interface and self.is_running:
+            self.request_node_list(force)
+
+    @Slot()
+    def request_node_list(self, force=True):
+        """Emits node_list_updated; with force=False the emit is skipped if no node changed since the last one."""
         if not self.meshtastic_interface or not self.is_running:
-            self.node_list_updated.emit([])
+            self._emit_nodes(())
             return
         try:
             current_nodes_dict = self.meshtastic_interface.nodes
 
             if current_nodes_dict is None:
-                print("[Meshtastic Handler] Node list is 'None' from interface.")
-                self.node_list_updated.emit([])
+                logger.warning("Node list is None from interface")
+                self._emit_nodes(())
                 return
             if not current_nodes_dict:
-                self.node_list_updated.emit([])
+                self._emit_nodes(())
                 return
 
-            for node_id, node_data_from_lib in current_nodes_dict.items():
-                if node_id == "!4357ebfc":
-                    print(f"[DEBUG MH MAP] Node !4357ebfc data from lib: {node_data_from_lib}")
-                    print(f"[DEBUG MH MAP] Position for !4357ebfc from lib: {node_data_from_lib.get('position')}")
-
-                lh_value_from_lib = node_data_from_lib.get('lastHeard')
-                sanitized_lh = 0.0
-                if lh_value_from_lib is not None:
-                    try:
-                        sanitized_lh = float(lh_value_from_lib)
-                    except (ValueError, TypeError):
-                        pass
-                node_data_from_lib['lastHeard'] = sanitized_lh
+            with self._nodes_write_lock:
+                new_nodes = dict(self._nodes)
+                for node_id, node_data_from_lib in current_nodes_dict.items():
+                    node_data_from_lib['lastHeard'] = _sanitize_last_heard(node_data_from_lib.get('lastHeard'))
 
-                current_active_report_state = self._nodes.get(node_id, {}).get('active_report', False)
+                    current_active_report_state = new_nodes.get(node_id, _EMPTY_MAPPING).get('active_report', False)
 
-                self._nodes[node_id] = node_data_from_lib
+                    new_nodes[node_id] = node_data_from_lib
 
-                if 'active_report' in self._nodes[node_id]:
-                    self._nodes[node_id]['active_report'] = current_active_report_state
-                else:
-                    self._nodes[node_id]['active_report'] = False
+                    if 'active_report' in node_data_from_lib:
+                        node_data_from_lib['active_report'] = current_active_report_state
+                    else:
+                        node_data_from_lib['active_report'] = False
+                self._nodes = MappingProxyType(new_nodes)
+            self._display_names.clear()
 
-            node_list_to_emit = list(self._nodes.values())
-            if node_list_to_emit and not all(isinstance(n, dict) for n in node_list_to_emit):
-                print(f"[Meshtastic Handler Error] Invalid node data format in list to emit.")
-                self.node_list_updated.emit([])
+            nodes_sig = hash(tuple((node_id, id(nd), nd.get('lastHeard'), nd.get('active_report'))
+                                   for node_id, nd in self._nodes.items()))
+            if not force and nodes_sig == self._last_nodes_sig:
                 return
+            self._last_nodes_sig = nodes_sig
 
-            self.node_list_updated.emit(node_list_to_emit)
+            self._emit_nodes(_freeze_nodes(self._nodes))
 
         except mesh_interface.MeshInterfaceError as mesh_err:
-            print(f"[Meshtastic Error] Failed fetching nodes (MeshInterfaceError): {mesh_err}")
-            self.node_list_updated.emit(list(self._nodes.values()))
+            logger.warning("Failed fetching nodes (MeshInterfaceError): %s", mesh_err)
+            self._emit_nodes(_freeze_nodes(self._nodes))
         except AttributeError as ae:
-            print(f"[Meshtastic Error] Failed fetching nodes, interface might be closing (AttributeError): {ae}")
-            self.node_list_updated.emit(list(self._nodes.values()))
-        except Exception as e:
-            print(f"[Meshtastic Error] Unexpected error fetching node list: {e}")
-            traceback.print_exc()
-            self.node_list_updated.emit(list(self._nodes.values()))
+            logger.warning("Failed fetching nodes, interface might be closing (AttributeError): %s", ae)
+            self._emit_nodes(_freeze_nodes(self._nodes))
+        except Exception:
+            logger.exception("Unexpected error fetching node list")
+            self._emit_nodes(_freeze_nodes(self._nodes))
 
     def reset_active_flags(self):
         """Reset all active_report flags and mark old nodes as inactive.
         This should be called periodically."""
+        # Only nodes flagged since the last sweep can have active_report set, so the sweep walks
+        # those instead of the whole table. lastHeard is numeric from ingestion on.
+        with self._dirty_lock:
+            active_ids, self._active_ids = self._active_ids, set()
         current_time = time.time()
-        for node_id, node_data in self._nodes.items():
-            last_heard_val = node_data.get("lastHeard")
-
-            lh_for_calculation = 0.0  # Default
-            if last_heard_val is not None:
-                try:
-                    lh_for_calculation = float(last_heard_val)
-                except (ValueError, TypeError):
-                    print(
-                        f"[Meshtastic Handler Warning] Node {node_id} had unconvertible lastHeard '{last_heard_val}' in reset_active_flags. Using 0.0.")
-
-            time_diff = current_time - lh_for_calculation
-
+        nodes = self._nodes
+        for node_id in active_ids:
+            node_data = nodes.get(node_id)
+            if node_data is None:
+                continue
+            time_diff = current_time - (node_data.get('lastHeard') or 0.0)
             if time_diff > NODE_ACTIVE_TIMEOUT_SEC:
-                if node_data.get('active_report', False):
-                    print(f"[Meshtastic Handler] Node {node_id} marked inactive due to timeout ({time_diff:.1f}s).")
-                node_data['active_report'] = False
-            else:
-                if node_data.get('active_report', False):
-                    pass
-                node_data['active_report'] = False
+                logger.debug("Node %s marked inactive due to timeout (%.1fs)", node_id, time_diff)
+            node_data['active_report'] = False
 
     @Slot()
     def request_channel_list(self):
-        print("[Meshtastic Handler] Requesting channel list...")
+        logger.debug("Requesting channel list")
         if not self.meshtastic_interface or not self.is_running:
-            print("[Meshtastic Handler] Cannot request channel list: not connected/running.")
+            logger.info("Cannot request channel list: not connected")
             self.channel_list_updated.emit([])
             return
 
         try:
             if not hasattr(self.meshtastic_interface, 'localNode') or not self.meshtastic_interface.localNode:
-                 print("[Meshtastic Handler] Error: localNode not available on interface.")
+                 logger.warning("localNode not available on interface")
                  self.channel_list_updated.emit([])
                  return
 
             channels = getattr(self.meshtastic_interface.localNode, 'channels', None)
             if channels is None:
-                 print("[Meshtastic Handler] localNode returned None for channels.")
+                 logger.warning("localNode returned None for channels")
                  self.channel_list_updated.emit([])
                  return
 
             channel_data_list = []
             for i, ch in enumerate(channels):
-                ch_settings = getattr(ch, 'settings', None)
-                if ch_settings:
-                    name = getattr(ch_settings, 'name', '') or (f"Primary" if i == 0 else f"Channel {i}")
-                    psk = getattr(ch_settings, 'psk', b'')
-                    is_encrypted = bool(psk)
-                    channel_data_list.append({
-                        'index': i,
-                        'name': name,
-                        'encrypted': is_encrypted
-                    })
-                else:
-                     print(f"[Meshtastic Handler] Warning: Channel at index {i} has no settings attribute.")
-
-            print(f"[Meshtastic Handler] Channels fetched: Count={len(channel_data_list)}")
+                # Channel protobufs always carry settings with name and psk fields; the
+                # AttributeError handler below covers library versions that differ.
+                ch_settings = ch.settings if hasattr(ch, 'settings') else None
+                if ch_settings is None:
+                    logger.warning("Channel at index %d has no settings attribute", i)
+                    continue
+                channel_data_list.append({
+                    'index': i,
+                    'name': ch_settings.name or ("Primary" if i == 0 else f"Channel {i}"),
+                    'encrypted': bool(ch_settings.psk)
+                })
+
+            logger.debug("Channels fetched: %d", len(channel_data_list))
             self.channel_list_updated.emit(channel_data_list)
 
         except AttributeError as ae:
-            print(f"[Meshtastic Handler] Error accessing channel attribute: {ae} (library version?).")
+            logger.warning("Error accessing channel attribute (library version?): %s", ae)
             self.channel_list_updated.emit([])
-        except Exception as e:
-            print(f"[Meshtastic Error] Unexpected error fetching channel list: {e}")
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Unexpected error fetching channel list")
             self.channel_list_updated.emit([])
 
     def get_latest_nodes(self) -> list:
@@ -484,34 +676,92 @@ class MeshtasticHandler(QObject):
 
     @Slot(str, str, int)
     def send_message(self, destination_id, text, channel_index=0):
-        print(
-            f"[Meshtastic Handler] send_message CALLED: Dest={destination_id}, Chan={channel_index}, Text='{text[:20]}...'")
-        if not self.meshtastic_interface or not self.is_running:
-            print("[Meshtastic Handler] Cannot send message: not connected/running.")
+        logger.debug("Tx: send_message dest=%s ch=%s text=%.20r", destination_id, channel_index, text)
+        tx_q = self._tx_q
+        if not self.meshtastic_interface or not self.is_running or tx_q is None:
+            logger.warning("Tx: cannot send message, not connected")
             return
 
         effective_destination_id = BROADCAST_ADDR_STR if destination_id == BROADCAST_ADDR_STR else destination_id
 
         try:
-            print(f"[Meshtastic Tx] Queuing sendText to {effective_destination_id} on Ch {channel_index}")
-            self.meshtastic_interface.sendText(
-                text=text,
-                destinationId=effective_destination_id,
-                channelIndex=channel_index
-            )
-            print("[Meshtastic Tx] Message queued successfully.")
-
-            if self._my_node_num is not None:
-                node_id = f"!{self._my_node_num:x}"
-                if node_id in self._nodes:
-                    self._nodes[node_id]['active_report'] = True
-                    self._nodes[node_id]['lastHeard'] = time.time()
-                    print(f"[Meshtastic Tx] Updated own node {node_id} to active status")
-                else:
-                    print(f"[Meshtastic Tx] Warning: Couldn't find own node {node_id} in nodes list")
-
-        except mesh_interface.MeshInterfaceError as mesh_err:
-            print(f"[Meshtastic Tx Error] MeshInterfaceError: {mesh_err}")
-        except Exception as e:
-            print(f"[Meshtastic Tx Error] Unexpected error sending: {e}")
-            traceback.print_exc()
+            tx_q.put_nowait((effective_destination_id, text, channel_index))
+        except queue.Full:
+            logger.warning("Tx: send queue full (%d), dropping message to %s", TX_QUEUE_MAX, effective_destination_id)
+            self.message_send_failed.emit(destination_id, "Send queue is full, try again shortly.")
+            return
+        logger.debug("Tx: queued sendText to %s on ch %s", effective_destination_id, channel_index)
+
+        node_id = self._my_node_id_str
+        if node_id is not None:
+            node = self._nodes.get(node_id)
+            if node is not None:
+                node['lastHeard'] = time.time()
+                if not node.get('active_report'):
+                    node['active_report'] = True
+                    self._mark_node_active(node_id)
+            else:
+                logger.debug("Tx: own node %s not in node list yet", node_id)
+
+    def _start_tx_thread(self, interface):
+        self._tx_q = queue.Queue(TX_QUEUE_MAX)
+        self._tx_thread = threading.Thread(target=self._tx_loop, args=(interface, self._tx_q),
+                                           name="MeshtasticTx", daemon=True)
+        self._tx_thread.start()
+
+    def _stop_tx_thread(self):
+        tx_q = self._tx_q
+        self._tx_q = None
+        self._tx_thread = None
+        if tx_q is not None:
+            try:
+                tx_q.put_nowait(None)
+            except queue.Full:
+                pass  # The loop also exits on its next item once the interface has changed.
+
+    def _tx_loop(self, interface, tx_q):
+        stopping = False
+        while not stopping:
+            # Collect whatever else is queued within a short window so back-to-back texts
+            # to the same destination can go out as one packet.
+            batch = [tx_q.get()]
+            deadline = time.monotonic() + TX_COALESCE_WINDOW_SEC
+            while len(batch) < TX_COALESCE_MAX_ITEMS:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(tx_q.get(timeout=remaining) if remaining > 0 else tx_q.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                stopping = True
+            if interface is not self.meshtastic_interface:
+                # Disconnected (or reconnected) with texts still queued: the chat window already
+                # shows them, so report each one instead of dropping it silently.
+                while True:
+                    try:
+                        item = tx_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        batch.append(item)
+                for destination_id, _text, _channel_index in batch:
+                    self.message_send_failed.emit(destination_id, "Disconnected before the message was sent.")
+                if batch:
+                    logger.warning("Tx: dropped %d unsent message(s) after disconnect", len(batch))
+                break
+
+            for destination_id, text, channel_index in _coalesce_texts(batch):
+                try:
+                    interface.sendText(
+                        text=text,
+                        destinationId=destination_id,
+                        channelIndex=channel_index
+                    )
+                    logger.debug("Tx: sent to %s", destination_id)
+                except mesh_interface.MeshInterfaceError as mesh_err:
+                    logger.warning("Tx: send to %s failed: %s", destination_id, mesh_err)
+                    self.message_send_failed.emit(destination_id, str(mesh_err))
+                except Exception as e:
+                    logger.exception("Tx: unexpected error sending to %s", destination_id)
+                    self.message_send_failed.emit(destination_id, str(e))
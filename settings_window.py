@@ -1,6 +1,5 @@
 import sys
 import os
-import traceback
 from typing import Dict, Any, List
 
 try: